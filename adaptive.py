@@ -0,0 +1,167 @@
+"""
+Adaptive concurrency and page size for the fetch engine.
+
+Concurrency follows AIMD: after doubling each round until the server first
+pushes back, it grows by about one request per round of responses while
+pages come back on time, and is cut by a factor when the server throttles,
+errors or takes more than twice the target latency. The page
+`limit` is steered so a single request takes about the target latency,
+from a running estimate of the seconds each task costs the server. As the
+API's cursor is opaque, a new limit only applies to chains started after it.
+
+Every decision is recorded in metrics.json under "adaptive".
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from client import Client
+from metrics import get_metrics
+
+
+class AdaptiveController:
+    """
+    Decides how many requests may be in flight and how many tasks to ask for
+    in each page. Used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        concurrency: int = 4,
+        max_concurrency: int = 16,
+        limit: int = 500,
+        min_limit: int = 50,
+        max_limit: int = 500,
+        target_latency: float = 2,
+    ):
+        self.client = client
+        self.concurrency = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.limit = limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+
+        self.in_flight = 0
+        self.condition: asyncio.Condition | None = None
+        # Running average of seconds per task returned
+        self.seconds_per_task: float | None = None
+        self.throttled = client.throttled
+        # Responses to requests sent before the last decrease shouldn't cut again
+        self.last_decrease = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait until another request is allowed in flight, and hold it until done."""
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.in_flight < int(self.concurrency)
+            )
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    # Called while holding a slot, so waiters see a raised limit when it's released
+    def record(
+        self, query: int, sent: float, latency: float, status: int, tasks: int
+    ) -> None:
+        """Adjust concurrency and page size from one response.
+
+        Args:
+            query (int): Index of the query the page belongs to
+            sent (float): time.monotonic() when the request was sent
+            latency (float): Seconds until the response, including any retries
+            status (int): HTTP status code
+            tasks (int): Tasks in the page
+        """
+        throttled = self.client.throttled - self.throttled
+        self.throttled = self.client.throttled
+        concurrency = self.concurrency
+        limit = self.limit
+
+        if throttled or status != 200:
+            reason = f"{throttled} throttled" if throttled else f"status {status}"
+            factor = 0.5
+        elif latency > self.target_latency * 2:
+            # Slightly slow pages are left to the page size to fix
+            reason = "slow"
+            factor = 0.75
+        else:
+            reason = None
+            factor = 1
+
+        if reason is None:
+            # Until the first pushback, grow by one per response (doubling each
+            # round) to find the server's limit quickly, then by one per round
+            if self.last_decrease:
+                action = "increase"
+                step = 1 / self.concurrency
+            else:
+                action = "increase: slow start"
+                step = 1
+            self.concurrency = min(self.max_concurrency, self.concurrency + step)
+        elif sent >= self.last_decrease:
+            action = f"decrease: {reason}"
+            self.concurrency = max(1.0, self.concurrency * factor)
+            self.last_decrease = time.monotonic()
+        else:
+            action = f"hold: {reason}, already decreased"
+
+        # Only whole pages say much about how long tasks take
+        if status == 200 and tasks and not throttled and tasks >= self.limit // 2:
+            cost = latency / tasks
+            if self.seconds_per_task is None:
+                self.seconds_per_task = cost
+            else:
+                self.seconds_per_task = 0.7 * self.seconds_per_task + 0.3 * cost
+            target = int(self.target_latency / self.seconds_per_task)
+            # At most double or halve at a time
+            target = max(self.limit // 2, min(self.limit * 2, target))
+            self.limit = max(self.min_limit, min(self.max_limit, target))
+
+        get_metrics().decision(
+            {
+                "query": query,
+                "status": status,
+                "latency": latency,
+                "tasks": tasks,
+                "throttled": throttled,
+                "in_flight": self.in_flight,
+                "action": action,
+                "concurrency": [round(concurrency, 2), round(self.concurrency, 2)],
+                "limit": [limit, self.limit],
+            }
+        )
+
+
+def controller_from_env(client: Client, workers: int) -> AdaptiveController | None:
+    """Create a controller if FETCH_ADAPTIVE=1.
+
+    Concurrency starts at `workers` and can grow to FETCH_MAX_WORKERS, and
+    pages aim to take FETCH_TARGET_LATENCY seconds.
+
+    Args:
+        client (Client): Client the requests go through, to notice throttling
+        workers (int): Requests in flight to start with
+
+    Returns:
+        AdaptiveController | None: The controller, or None to use a fixed limit
+    """
+    if os.getenv("FETCH_ADAPTIVE", "0") != "1":
+        return None
+    return AdaptiveController(
+        client,
+        concurrency=workers,
+        max_concurrency=max(workers, int(os.getenv("FETCH_MAX_WORKERS", "16"))),
+        target_latency=float(os.getenv("FETCH_TARGET_LATENCY", "2")),
+    )
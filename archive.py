@@ -0,0 +1,179 @@
+"""
+Compressed archive of the raw API responses, written one page at a time as
+they arrive, so an export can be re-run later without the network.
+
+The archive is gzipped NDJSON. The first line describes the run and every
+other line holds one page: the index of the query it belongs to, the page's
+metadata and its data.
+"""
+
+import gzip
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+from metrics import get_metrics
+
+
+class ArchiveWriter:
+    """
+    Appends pages to an archive while they are being fetched.
+    Safe to write to from several threads.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str,
+        start_date: str,
+        end_date: str,
+        year_group: int | None = None,
+    ):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, "wt", encoding="UTF-8", compresslevel=6)
+        self._write_line(
+            {
+                "mode": mode,
+                "start": start_date,
+                "end": end_date,
+                # set when only this year group was requested from the server
+                "year_group": year_group,
+                "created": datetime.now().isoformat(timespec="seconds"),
+            }
+        )
+
+    def _write_line(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":"))
+        with self.lock:
+            self.file.write(line)
+            self.file.write("\n")
+
+    def write(self, query: int, page: dict) -> None:
+        """Append one page of a query.
+
+        Args:
+            query (int): Index of the query the page belongs to
+            page (dict): Page returned by the API, including its metadata
+        """
+        with get_metrics().stage("save"):
+            self._write_line(
+                {"query": query, "metadata": page["metadata"], "data": page["data"]}
+            )
+
+    def write_tasks(self, tasks: List[dict], limit: int = 500) -> None:
+        """Append tasks that did not come straight from the API, e.g. from the
+        local store, split into pages of a single query.
+
+        Args:
+            tasks (List[dict]): JSON data for each task
+            limit (int, optional): Tasks per page. Defaults to 500.
+        """
+        for start in range(0, max(len(tasks), 1), limit):
+            end = start + limit
+            self.write(
+                0,
+                {
+                    "metadata": {
+                        "cursor": str(end) if end < len(tasks) else None,
+                        "count": len(tasks),
+                    },
+                    "data": tasks[start:end],
+                },
+            )
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_header(path: str) -> dict:
+    """Read the description of the run that wrote an archive.
+
+    Args:
+        path (str): Archive to read
+
+    Returns:
+        dict: Mode, start and end dates, year group if filtered on the server, and
+            creation time of the run
+    """
+    with gzip.open(path, "rt", encoding="UTF-8") as f:
+        return json.loads(f.readline())
+
+
+def iter_pages(path: str) -> Iterator[Tuple[int, dict]]:
+    """Read the pages of an archive lazily, one line at a time.
+
+    Args:
+        path (str): Archive to read
+
+    Yields:
+        Tuple[int, dict]: Index of the query and the page
+    """
+    with gzip.open(path, "rt", encoding="UTF-8") as f:
+        f.readline()
+        for line in f:
+            record = json.loads(line)
+            yield record["query"], record
+
+
+def iter_tasks(path: str) -> Iterator[dict]:
+    """Read the tasks of an archive lazily, in the same order a live fetch
+    returns them: query by query, each in cursor order.
+
+    Queries are fetched concurrently, so pages of later queries can be
+    archived before earlier queries finish. Those are held back until their
+    turn, which only buffers the pages that arrived out of order.
+
+    Args:
+        path (str): Archive to read
+
+    Yields:
+        dict: Each task in the archive, de-duplicated by id
+    """
+    # The greedy timezone filter overlaps neighbouring shards, so the same
+    # assessment can be archived twice. Keep the first copy.
+    seen = set()
+    fetched: Dict[int, int] = {}
+    counts: Dict[int, int] = {}
+    held: Dict[int, List[dict]] = {}
+    current = 0
+
+    def emit(page: dict) -> Iterator[dict]:
+        for task in page["data"]:
+            if task["id"] in seen:
+                continue
+            seen.add(task["id"])
+            yield task
+
+    for query, page in iter_pages(path):
+        fetched[query] = fetched.get(query, 0) + len(page["data"])
+        counts[query] = page["metadata"]["count"]
+        if query != current:
+            held.setdefault(query, []).append(page)
+            continue
+
+        yield from emit(page)
+        # Once a query's last page is out, release the queries after it
+        while page["metadata"]["cursor"] is None:
+            current += 1
+            pages = held.pop(current, [])
+            for page in pages:
+                yield from emit(page)
+            if not pages:
+                break
+
+    # Pages of a query that never finished are still held back
+    for query in sorted(held):
+        for page in held[query]:
+            yield from emit(page)
+
+    # A fetch that was interrupted leaves some queries short
+    assert fetched == counts
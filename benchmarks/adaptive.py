@@ -0,0 +1,103 @@
+"""
+Compares fixed concurrency on the fetch engine with the adaptive controller,
+against a mock server that throttles beyond a number of requests in flight
+and takes longer for bigger pages.
+
+Run from the repository root:
+    python -m benchmarks.adaptive [--tasks 20000] [--max-in-flight 6] [--workers 2 16]
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+from benchmarks.mock_server import MockSchoolbox, serve
+from benchmarks.synthetic import make_tasks
+
+# Measure the network path, not the response cache
+os.environ["CACHE_TTL"] = "0"
+
+# pylint: disable=wrong-import-position
+from adaptive import AdaptiveController
+from client import get_client
+from engine import fetch_queries
+from input import build_params, split_date_range
+from metrics import get_metrics
+
+START = datetime(2024, 1, 29)
+END = datetime(2024, 11, 24)
+MODE = "All tasks overview"
+
+
+def run(name: str, api: MockSchoolbox, fetch) -> None:
+    requests, throttled = api.requests, api.throttled
+    start = time.perf_counter()
+    tasks = sum(len(shard) for shard in fetch())
+    seconds = time.perf_counter() - start
+    print(
+        f"  {name:<12} {seconds:7.2f} s {api.requests - requests:6} requests "
+        f"{api.throttled - throttled:5} throttled {tasks / seconds:9.0f} tasks/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=1500)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--task-latency", type=float, default=0.001, help="seconds")
+    parser.add_argument("--max-in-flight", type=int, default=6)
+    parser.add_argument("--retry-after", type=float, default=0.5, help="seconds")
+    parser.add_argument("--target-latency", type=float, default=1, help="seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 16])
+    args = parser.parse_args()
+
+    api = MockSchoolbox(
+        make_tasks(args.tasks, args.students),
+        args.latency,
+        retry_after=args.retry_after,
+        max_in_flight=args.max_in_flight,
+        task_latency=args.task_latency,
+    )
+    server, host = serve(api)
+    headers = {"Authorization": "Bearer mock", "Accept": "application/json"}
+    queries = [
+        build_params(first, last, MODE)
+        for first, last in split_date_range(START, END, "week")
+    ]
+    print(
+        f"{args.tasks} tasks in {len(queries)} queries, server allows "
+        f"{args.max_in_flight} requests in flight"
+    )
+
+    for workers in args.workers:
+        run(
+            f"fixed={workers}",
+            api,
+            lambda: fetch_queries(host, headers, queries, workers),
+        )
+
+    controller = AdaptiveController(
+        get_client(host),
+        concurrency=args.workers[0],
+        max_concurrency=max(args.workers),
+        target_latency=args.target_latency,
+    )
+    run(
+        "adaptive",
+        api,
+        lambda: fetch_queries(host, headers, queries, controller=controller),
+    )
+    decisions = get_metrics().decisions
+    print(
+        f"  settled at {controller.concurrency:.1f} in flight and limit "
+        f"{controller.limit}, "
+        f"{sum(1 for d in decisions if not d['action'].startswith('increase'))} "
+        f"of {len(decisions)} decisions backed off"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
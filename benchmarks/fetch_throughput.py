@@ -0,0 +1,106 @@
+"""
+Measures end-to-end throughput of the fetch path against the local mock
+Schoolbox server, for serial, sharded and streaming fetches, and for several
+independent queries (one per mode and month) run one after another or
+together on the fetch engine.
+
+Run from the repository root:
+    python -m benchmarks.fetch_throughput [--tasks 5000] [--latency 0.1] [--shards 1 4 12]
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+from benchmarks.mock_server import MockSchoolbox, serve
+from benchmarks.synthetic import make_tasks
+
+# Measure the network path, not the response cache
+os.environ["CACHE_TTL"] = "0"
+
+# pylint: disable=wrong-import-position
+from engine import fetch_queries
+from input import MODES, build_params, fetch_window, split_date_range, stream_tasks
+
+START = datetime(2024, 1, 29)
+END = datetime(2024, 11, 24)
+MODE = "Markbook export"
+
+
+def run(name: str, api: MockSchoolbox, fetch) -> None:
+    requests, sent = api.requests, api.bytes_sent
+    start = time.perf_counter()
+    tasks = fetch()
+    seconds = time.perf_counter() - start
+    print(
+        f"  {name:<16} {seconds:7.2f} s {api.requests - requests:6} pages "
+        f"{tasks:7} tasks {tasks / seconds:9.0f} tasks/s "
+        f"{(api.bytes_sent - sent) / 1024 / 1024:8.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=1500)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--shards", nargs="+", default=["1", "4", "12"])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    api = MockSchoolbox(
+        make_tasks(args.tasks, args.students),
+        args.latency,
+        args.jitter,
+        args.error_rate,
+    )
+    server, host = serve(api)
+    headers = {"Authorization": "Bearer mock", "Accept": "application/json"}
+
+    print(
+        f"{args.tasks} tasks, {args.latency * 1000:.0f} ms latency, "
+        f"{args.error_rate:.1%} errors"
+    )
+    for shards in args.shards:
+        ranges = split_date_range(START, END, shards)
+        run(
+            f"shards={shards}",
+            api,
+            lambda: len(fetch_window(host, headers, ranges, MODE, args.workers)),
+        )
+    run(
+        "stream",
+        api,
+        lambda: sum(1 for _ in stream_tasks(host, headers, [(START, END)], MODE)),
+    )
+
+    queries = [
+        build_params(first, last, mode)
+        for mode in MODES
+        for first, last in split_date_range(START, END, "month")
+    ]
+    print(f"{len(queries)} independent queries")
+    run(
+        "sequential",
+        api,
+        lambda: sum(
+            len(shard)
+            for query in queries
+            for shard in fetch_queries(host, headers, [query], 1)
+        ),
+    )
+    run(
+        f"engine={args.workers}",
+        api,
+        lambda: sum(
+            len(shard) for shard in fetch_queries(host, headers, queries, args.workers)
+        ),
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares the indexed Result filters against the original linear scan.
+
+Run from the repository root:
+    python -m benchmarks.filter_index [assessments]
+"""
+
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import List
+
+from model import Assessment, Folder, Result, WorkType
+
+
+def linear_filter(
+    data: List["Assessment"], year: int, start_date: str, end_date: str
+) -> List["Assessment"]:
+    """The original Result.filter_by_year_and_date, kept as a reference."""
+    return list(
+        filter(
+            lambda a: a.folder.code is not None
+            and (
+                (isinstance(a.folder.code, str) and a.folder.code.startswith(str(year)))
+                or (
+                    isinstance(a.folder.code, list)
+                    and any(c.startswith(str(year)) for c in a.folder.code)
+                )
+            )
+            and start_date <= a.due_date
+            and a.due_date <= end_date,
+            data,
+        )
+    )
+
+
+def make_assessments(count: int) -> List["Assessment"]:
+    rng = random.Random(0)
+    first = date(2024, 1, 29)
+    assessments = []
+    for i in range(count):
+        year = rng.randint(7, 13)
+        code = (
+            f"{year}{rng.choice(['PE', 'SCI', 'ENG', 'MAT', 'DAT'])}{rng.randint(1, 6)}"
+        )
+        if rng.random() < 0.1:
+            code = [code, f"{year}ALT{rng.randint(1, 3)}"]
+        elif rng.random() < 0.02:
+            code = None
+        due_date = (first + timedelta(days=rng.randint(0, 300))).strftime("%Y-%m-%d")
+        assessments.append(
+            Assessment(
+                i,
+                f"Task {i}",
+                "",
+                False,
+                WorkType(None, None),
+                Folder(str(i), f"{year} Subject 1C", code, []),
+                "",
+                "",
+                10,
+                due_date,
+                [],
+            )
+        )
+    return assessments
+
+
+def best_of(repeats: int, function, *args) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    data = make_assessments(count)
+    start_date, end_date = "2024-04-01", "2024-06-30"
+    years = range(7, 14)
+
+    result = Result(data)
+    start = time.perf_counter()
+    _ = result.year_index
+    build = time.perf_counter() - start
+
+    for year in years:
+        assert result.filter_by_year_and_date(
+            year, start_date, end_date
+        ) == linear_filter(data, year, start_date, end_date)
+
+    linear = best_of(
+        5, lambda: [linear_filter(data, y, start_date, end_date) for y in years]
+    )
+    indexed = best_of(
+        5,
+        lambda: [
+            result.filter_by_year_and_date(y, start_date, end_date) for y in years
+        ],
+    )
+    combined = best_of(
+        5, result.filter_by_years_and_date, list(years), start_date, end_date
+    )
+
+    print(f"{count} assessments, years 7-13, {start_date} to {end_date}")
+    print(f"  index build:                  {build * 1000:8.2f} ms")
+    print(f"  linear, one year at a time:   {linear * 1000:8.2f} ms")
+    print(f"  indexed, one year at a time:  {indexed * 1000:8.2f} ms")
+    print(f"  indexed, all years at once:   {combined * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
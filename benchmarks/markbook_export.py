@@ -0,0 +1,59 @@
+"""
+Compares the speed of the single pass Markbook exporter with the separate
+task and mark generators. tests/test_export.py checks the output against
+the original generators.
+
+Run from the repository root:
+    python -m benchmarks.markbook_export [tasks] [students]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.synthetic import make_tasks
+from export import generate_assessments_csv, generate_markbook_csv, generate_marks_csv
+from model import AssessmentView
+from process import normalize, parse_json
+
+
+def make_views(tasks: int, students: int) -> List["AssessmentView"]:
+    result = parse_json(make_tasks(tasks, students), "Markbook export")
+    return [normalize(a) for a in result.data]
+
+
+def timed(directory: str, function, *args) -> float:
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    students = int(sys.argv[2]) if len(sys.argv) > 2 else 1_500
+    views = make_views(tasks, students)
+
+    with tempfile.TemporaryDirectory() as separate, tempfile.TemporaryDirectory() as single:
+        before = timed(
+            separate,
+            lambda: (
+                generate_assessments_csv(views, 9, "a", "b"),
+                generate_marks_csv(views, 9, "a", "b"),
+            ),
+        )
+        after = timed(single, generate_markbook_csv, views, 9, "a", "b")
+
+    print(f"{tasks} tasks, {students} students")
+    print(f"  separate generators: {before:6.2f} s")
+    print(f"  single pass:         {after:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
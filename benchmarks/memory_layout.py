@@ -0,0 +1,185 @@
+"""
+Compares the memory used by parsed assessments with the slotted models and
+shared student registry against the previous plain dataclass layout.
+
+Run from the repository root:
+    python -m benchmarks.memory_layout [tasks] [students] [class_size]
+"""
+
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+
+from process import parse_json
+
+
+@dataclass
+class LegacyParticipant:
+    internal_id: str
+    external_id: str
+    title: str
+    first_name: str
+    preferred_name: str
+    last_name: str
+    mark: str
+    comment: str
+
+
+@dataclass
+class LegacyFolder:
+    internal_id: str
+    name: str
+    code: str
+    year_levels: list
+
+
+@dataclass
+class LegacyWorkType:
+    internal_id: str | None
+    name: str | None
+
+
+@dataclass
+class LegacyAssessment:
+    internal_id: int
+    title: str
+    assessment_type: str
+    common_assessment: bool
+    work_type: LegacyWorkType
+    folder: LegacyFolder
+    subject_code: str
+    project: str
+    weight: float
+    due_date: str
+    participants: List[LegacyParticipant]
+
+
+def legacy_parse(assessment_data: list[dict]) -> List[LegacyAssessment]:
+    """Builds the same object graph parse_json used to, for comparison."""
+    assessments = []
+    for task in assessment_data:
+        participants = [
+            LegacyParticipant(
+                student["learner"]["id"],
+                student["learner"]["externalId"],
+                student["learner"]["title"],
+                student["learner"]["firstName"],
+                student["learner"]["preferredName"],
+                student["learner"]["lastName"],
+                student["feedback"]["mark"],
+                student["feedback"]["comment"],
+            )
+            for student in task["participants"]
+        ]
+        date = datetime.strptime(task["dueDate"], "%Y-%m-%dT%H:%M:%S%z")
+        assessments.append(
+            LegacyAssessment(
+                task["id"],
+                task["title"],
+                task["assessmentType"],
+                task["commonAssessment"],
+                LegacyWorkType(task["workType"]["id"], task["workType"]["name"]),
+                LegacyFolder(
+                    task["folder"]["id"],
+                    task["folder"]["name"],
+                    task["folder"]["code"],
+                    task["folder"]["yearLevel"],
+                ),
+                task["subjectCode"],
+                task["project"],
+                task["weight"],
+                date.strftime("%Y-%m-%d"),
+                participants,
+            )
+        )
+    return assessments
+
+
+def make_payload(tasks: int, students: int, class_size: int) -> str:
+    rng = random.Random(0)
+    learners = [
+        {
+            "id": str(s),
+            "externalId": f"S{s:05}",
+            "title": rng.choice(["Mr", "Ms", "Mx"]),
+            "firstName": f"Firstname{s}",
+            "preferredName": f"Preferred{s}",
+            "lastName": f"Lastname{s}",
+        }
+        for s in range(students)
+    ]
+    data = [
+        {
+            "id": i,
+            "title": f"Assessment task {i}",
+            "assessmentType": "assignment",
+            "commonAssessment": False,
+            "workType": {"id": "1", "name": "Assessment task"},
+            "folder": {
+                "id": str(i % 300),
+                "name": f"9 Subject {i % 300} 1C",
+                "code": f"9SUB{i % 300}",
+                "yearLevel": [],
+            },
+            "subjectCode": "SUB",
+            "project": "",
+            "weight": 10,
+            "dueDate": f"2024-{1 + i % 12:02}-{1 + i % 28:02}T09:00:00+11:00",
+            "participants": [
+                {
+                    "learner": learner,
+                    "instructor": None,
+                    "feedback": {
+                        "instructor": None,
+                        "mark": f"{rng.randint(0, 55)} / 55",
+                        "comment": "",
+                    },
+                }
+                for learner in rng.sample(learners, class_size)
+            ],
+        }
+        for i in range(tasks)
+    ]
+    return json.dumps(data)
+
+
+def measure(function, payload: str):
+    # Decoding is traced too, as the models keep the decoded strings alive
+    gc.collect()
+    tracemalloc.start()
+    data = json.loads(payload)
+    result = function(data)
+    del data
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    students = int(sys.argv[2]) if len(sys.argv) > 2 else 1_500
+    class_size = int(sys.argv[3]) if len(sys.argv) > 3 else 25
+    payload = make_payload(tasks, students, class_size)
+
+    legacy = measure(legacy_parse, payload)
+    current = measure(lambda data: parse_json(data, "Markbook export"), payload)
+
+    mib = 1024 * 1024
+    print(f"{tasks} tasks, {students} students, {class_size} per task")
+    print("                  retained       peak")
+    print(f"  plain:         {legacy[0] / mib:7.1f} MiB {legacy[1] / mib:7.1f} MiB")
+    print(f"  slotted:       {current[0] / mib:7.1f} MiB {current[1] / mib:7.1f} MiB")
+    retained = 1 - current[0] / legacy[0]
+    peak = 1 - current[1] / legacy[1]
+    print(f"  reduction:     {retained:7.1%}     {peak:7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+A local stand-in for the Schoolbox assessment endpoint, serving synthetic
+data with cursor pagination and the filter/limit parameters. Latency (fixed
+and per task), jitter, server errors, 429 responses (at random or beyond a
+number of requests in flight) and payload size are configurable, so the fetch
+path can be load-tested offline. The yearLevel filter and `fields` projection
+can be supported, ignored or rejected, to test push-down and its fallbacks.
+Pages carry an ETag and are answered with 304 when it still matches, and the
+tasks can be replaced while serving, to test --watch.
+
+Run from the repository root, then point HOST at the printed URL:
+    python -m benchmarks.mock_server [--tasks 5000] [--latency 0.2] [--error-rate 0.01]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import make_tasks
+
+
+class MockSchoolbox:
+    """
+    Serves pages of tasks the way /api/assessment does.
+    """
+
+    def __init__(
+        self,
+        tasks: List[dict],
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        throttle_rate: float = 0,
+        retry_after: float = 1,
+        seed: int = 0,
+        pushdown: str = "support",
+        etags: bool = True,
+        max_in_flight: int = 0,
+        task_latency: float = 0,
+    ):
+        self.tasks = tasks
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        # "support", "ignore" or "reject" the yearLevel filter and fields projection
+        self.pushdown = pushdown
+        self.etags = etags
+        # Throttle requests beyond this many at once, 0 for no limit
+        self.max_in_flight = max_in_flight
+        # Extra seconds per task in the page, so big pages are slower
+        self.task_latency = task_latency
+        self.in_flight = 0
+
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.filtered: Dict[str, List[dict]] = {}
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+        self.not_modified = 0
+
+    def matches(self, task: dict, query: dict) -> bool:
+        if query.get("weighted") and not task["weight"]:
+            return False
+        if "workType" in query:
+            if task["workType"] is None:
+                return False
+            if task["workType"]["name"] != query["workType"].get("name"):
+                return False
+        if "dueDate" in query:
+            due = datetime.fromisoformat(task["dueDate"])
+            window = query["dueDate"]
+            if "from" in window and due < datetime.fromisoformat(window["from"]):
+                return False
+            if "to" in window and due > datetime.fromisoformat(window["to"]):
+                return False
+        if "yearLevel" in query and self.pushdown == "support":
+            names = [level["name"] for level in task["folder"]["yearLevel"]]
+            if query["yearLevel"].get("name") not in names:
+                return False
+        return True
+
+    def set_tasks(self, tasks: List[dict]) -> None:
+        """Replace the tasks being served, as if they were edited in Schoolbox.
+
+        Args:
+            tasks (List[dict]): New tasks
+        """
+        with self.lock:
+            self.tasks = tasks
+            self.filtered.clear()
+
+    def select(self, raw_filter: str) -> List[dict]:
+        with self.lock:
+            if raw_filter not in self.filtered:
+                query = json.loads(raw_filter) if raw_filter else {}
+                self.filtered[raw_filter] = [
+                    task for task in self.tasks if self.matches(task, query)
+                ]
+            return self.filtered[raw_filter]
+
+    def respond(self, query: Dict[str, str]) -> Tuple[int, Dict[str, str], dict]:
+        """Build the response for a request.
+
+        Args:
+            query (Dict[str, str]): Query string parameters
+
+        Returns:
+            Tuple[int, Dict[str, str], dict]: Status code, extra headers and JSON body
+        """
+        with self.lock:
+            self.requests += 1
+            delay = max(0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            roll = self.rng.random()
+            overloaded = (
+                bool(self.max_in_flight) and self.in_flight >= self.max_in_flight
+            )
+            if not overloaded:
+                self.in_flight += 1
+        if overloaded:
+            with self.lock:
+                self.throttled += 1
+            return (
+                429,
+                {"Retry-After": str(self.retry_after)},
+                {"error": "Too Many Requests"},
+            )
+        try:
+            return self.serve_page(query, delay, roll)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def serve_page(
+        self, query: Dict[str, str], delay: float, roll: float
+    ) -> Tuple[int, Dict[str, str], dict]:
+        time.sleep(delay)
+
+        if roll < self.throttle_rate:
+            with self.lock:
+                self.throttled += 1
+            return (
+                429,
+                {"Retry-After": str(self.retry_after)},
+                {"error": "Too Many Requests"},
+            )
+        if roll < self.throttle_rate + self.error_rate:
+            with self.lock:
+                self.errors += 1
+            return 500, {}, {"error": "Internal Server Error"}
+
+        if self.pushdown == "reject" and (
+            "fields" in query or "yearLevel" in query.get("filter", "")
+        ):
+            return 400, {}, {"error": "Unsupported filter"}
+        try:
+            tasks = self.select(query.get("filter", ""))
+        except ValueError:
+            return 400, {}, {"error": "Invalid filter"}
+
+        limit = int(query.get("limit", 100))
+        start = int(query.get("cursor") or 0)
+        end = start + limit
+        page = tasks[start:end]
+        time.sleep(self.task_latency * len(page))
+        if "fields" in query and self.pushdown == "support":
+            fields = query["fields"].split(",")
+            page = [{key: task[key] for key in fields if key in task} for task in page]
+        return (
+            200,
+            {},
+            {
+                "data": page,
+                "metadata": {
+                    "cursor": str(end) if end < len(tasks) else None,
+                    "count": len(tasks),
+                },
+            },
+        )
+
+
+def make_handler(api: MockSchoolbox):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            query = {
+                key: values[-1]
+                for key, values in parse_qs(urlparse(self.path).query).items()
+            }
+            status, headers, body = api.respond(query)
+
+            payload = json.dumps(body).encode("UTF-8")
+            if status == 200 and api.etags:
+                etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    with api.lock:
+                        api.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                headers["ETag"] = etag
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                payload = gzip.compress(payload, compresslevel=1)
+                headers["Content-Encoding"] = "gzip"
+            with api.lock:
+                api.bytes_sent += len(payload)
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    return Handler
+
+
+def serve(api: MockSchoolbox, host: str = "127.0.0.1", port: int = 0):
+    """Start the mock server in a background thread.
+
+    Args:
+        api (MockSchoolbox): Data and behaviour to serve
+        host (str, optional): Interface to listen on. Defaults to "127.0.0.1".
+        port (int, optional): Port to listen on, 0 picks a free one. Defaults to 0.
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The server and the URL to use as HOST
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api/assessment"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=1500)
+    parser.add_argument("--class-size", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--retry-after", type=float, default=1, help="seconds")
+    parser.add_argument(
+        "--pushdown", choices=["support", "ignore", "reject"], default="support"
+    )
+    parser.add_argument("--no-etags", action="store_true", help="never answer 304")
+    parser.add_argument(
+        "--max-in-flight", type=int, default=0, help="429 beyond this many requests"
+    )
+    parser.add_argument("--task-latency", type=float, default=0, help="seconds")
+    args = parser.parse_args()
+
+    api = MockSchoolbox(
+        make_tasks(args.tasks, args.students, args.class_size),
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.throttle_rate,
+        args.retry_after,
+        pushdown=args.pushdown,
+        etags=not args.no_etags,
+        max_in_flight=args.max_in_flight,
+        task_latency=args.task_latency,
+    )
+    server, url = serve(api, port=args.port)
+    print(f'HOST="{url}"')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(
+            f"{api.requests} requests, {api.errors} errors, "
+            f"{api.throttled} throttled, {api.not_modified} not modified, "
+            f"{api.bytes_sent} bytes sent"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measures the memoised due date parser against strptime, and how long
+parse_json takes in all.
+
+Run from the repository root:
+    python -m benchmarks.parse_due_date [--tasks 20000]
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from benchmarks.synthetic import make_tasks
+from process import parse_due_date, parse_json
+
+MODE = "Markbook export"
+
+
+def time_dates(tasks) -> None:
+    due_dates = [task["dueDate"] for task in tasks]
+
+    start = time.perf_counter()
+    for due_date in due_dates:
+        datetime.strptime(due_date, "%Y-%m-%dT%H:%M:%S%z").strftime("%Y-%m-%d")
+    strptime = time.perf_counter() - start
+
+    parse_due_date.cache_clear()
+    start = time.perf_counter()
+    for due_date in due_dates:
+        parse_due_date(due_date)
+    memoised = time.perf_counter() - start
+
+    print(
+        f"due dates: strptime {strptime * 1000:.1f} ms, memoised "
+        f"{memoised * 1000:.1f} ms ({parse_due_date.cache_info().currsize} distinct)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=1500)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks, args.students)
+    print(f"{args.tasks} tasks")
+    time_dates(tasks)
+
+    start = time.perf_counter()
+    parse_json(tasks, MODE)
+    print(f"parse_json: {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Reports bytes transferred with and without the year level filter and field
+projection pushed down to the server, for each mode, and checks that the
+filtered assessments are the same. The mock server can support, ignore or
+reject push-down, to check the fallbacks too.
+
+Run from the repository root:
+    python -m benchmarks.pushdown [--tasks 5000] [--year 9]
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+from benchmarks.mock_server import MockSchoolbox, serve
+from benchmarks.synthetic import make_tasks
+
+# Measure the network path, not the response cache
+os.environ["CACHE_TTL"] = "0"
+
+# pylint: disable=wrong-import-position
+from input import MODES, fetch_window, probe_pushdown, split_date_range
+from process import parse_json
+
+START = datetime(2024, 1, 29)
+END = datetime(2024, 11, 24)
+
+
+def export_ids(data, mode, year):
+    result = parse_json(data, mode)
+    return [
+        a.internal_id
+        for a in result.filter_by_year_and_date(
+            year, START.strftime("%Y-%m-%d"), END.strftime("%Y-%m-%d")
+        )
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=1500)
+    parser.add_argument("--year", type=int, default=9)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks, args.students)
+    headers = {"Authorization": "Bearer mock", "Accept": "application/json"}
+    ranges = split_date_range(START, END, 1)
+
+    print(f"{args.tasks} tasks, year {args.year}")
+    for behaviour in ["support", "ignore", "reject"]:
+        api = MockSchoolbox(tasks, pushdown=behaviour)
+        server, host = serve(api)
+        print(f"server {behaviour}s push-down")
+        for mode in MODES:
+            sent = api.bytes_sent
+            data = fetch_window(host, headers, ranges, mode, 4)
+            before = api.bytes_sent - sent
+
+            sent = api.bytes_sent
+            year, fields = probe_pushdown(host, headers, START, END, mode, args.year)
+            pushed = fetch_window(host, headers, ranges, mode, 4, None, year, fields)
+            after = api.bytes_sent - sent
+
+            assert export_ids(data, mode, args.year) == export_ids(
+                pushed, mode, args.year
+            )
+            print(
+                f"  {mode:<20} {before / 1024:9.0f} KiB -> {after / 1024:9.0f} KiB "
+                f"({after / before:6.1%})"
+            )
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
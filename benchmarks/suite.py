@@ -0,0 +1,159 @@
+"""
+Times parse_json, the year/date filter and each export generator on
+synthetic data at several sizes, and saves the results as JSON so they can
+be compared between versions.
+
+Run from the repository root:
+    python -m benchmarks.suite [--sizes 500 2000 8000] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+from benchmarks.synthetic import make_tasks
+from export import (
+    generate_assessments_csv,
+    generate_assessments_simple_csv,
+    generate_comments_csv,
+    generate_markbook_csv,
+    generate_marks_csv,
+)
+from process import normalize, parse_json
+
+START_DATE = "2024-01-29"
+END_DATE = "2024-11-24"
+YEARS = range(7, 13)
+
+
+def best_of(repeats: int, function: Callable[[], object]) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_size(tasks: int, students: int, repeats: int) -> Dict[str, float]:
+    data = make_tasks(tasks, students)
+    timings = {}
+
+    timings["parse_json overview"] = best_of(
+        repeats, lambda: parse_json(data, "All tasks overview")
+    )
+    timings["parse_json markbook"] = best_of(
+        repeats, lambda: parse_json(data, "Markbook export")
+    )
+
+    overview = parse_json(data, "All tasks overview")
+    result = parse_json(data, "Markbook export")
+    timings["filter_by_year_and_date"] = best_of(
+        repeats,
+        lambda: [
+            result.filter_by_year_and_date(year, START_DATE, END_DATE) for year in YEARS
+        ],
+    )
+
+    overview_views = [normalize(a) for a in overview.data]
+    views = [normalize(a) for a in result.data]
+    timings["normalize"] = best_of(repeats, lambda: [normalize(a) for a in result.data])
+
+    generators = {
+        "generate_assessments_simple_csv": (
+            generate_assessments_simple_csv,
+            overview_views,
+        ),
+        "generate_assessments_csv": (generate_assessments_csv, views),
+        "generate_marks_csv": (generate_marks_csv, views),
+        "generate_markbook_csv": (generate_markbook_csv, views),
+        "generate_comments_csv": (generate_comments_csv, views),
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for name, (generator, items) in generators.items():
+                timings[name] = best_of(
+                    repeats, lambda: generator(items, 9, START_DATE, END_DATE)
+                )
+        finally:
+            os.chdir(cwd)
+
+    return timings
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_file: str) -> None:
+    with open(baseline_file, "r", encoding="UTF-8") as f:
+        baseline = json.load(f)["results"]
+
+    print(f"\nCompared with {baseline_file} (ratio < 1 is faster)")
+    for size, timings in results.items():
+        if size not in baseline:
+            continue
+        for name, seconds in timings.items():
+            before = baseline[size].get(name)
+            if before:
+                print(f"  {size:>6} {name:<34} {seconds / before:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--students", type=int, default=1500)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="results file from an earlier run")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for size in args.sizes:
+        results[str(size)] = run_size(size, args.students, args.repeats)
+        print(f"\n{size} tasks, {args.students} students")
+        for name, seconds in results[str(size)].items():
+            print(f"  {name:<34} {seconds * 1000:9.1f} ms")
+
+    commit = git_commit()
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{commit or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="UTF-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "students": args.students,
+                "repeats": args.repeats,
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
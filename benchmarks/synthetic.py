@@ -0,0 +1,159 @@
+"""
+Generates realistic Schoolbox /api/assessment data for benchmarks, in the
+shape parse_json consumes.
+"""
+
+import random
+from datetime import date, timedelta
+from typing import List
+
+SUBJECTS = ["PE", "SCI", "ENG", "MAT", "DAT", "HIS", "GEO", "ART", "MUS", "LAN"]
+YEARS = range(7, 14)
+
+
+def make_students(students: int, rng: random.Random) -> List[dict]:
+    return [
+        {
+            "id": str(100000 + s),
+            "externalId": f"{20000 + s}",
+            "title": rng.choice(["Mr", "Ms", "Mx", ""]),
+            "firstName": f"First{s}",
+            "preferredName": rng.choice(["", f"Pref{s}"]),
+            "lastName": f"Last{s}",
+        }
+        for s in range(students)
+    ]
+
+
+def make_mark(out_of: int | None, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.1:
+        return "Not Assessed"
+    if roll < 0.11:
+        return "Pending"
+    if out_of is None:
+        return f"{rng.uniform(0, 100):.2f} %"
+    return f"{rng.randint(0, out_of)} / {out_of}"
+
+
+def make_tasks(
+    tasks: int, students: int, class_size: int = 25, seed: int = 0
+) -> List[dict]:
+    """Make a list of tasks as returned in the "data" of each API page.
+
+    Covers the shapes parse_json has to handle: workType null or set,
+    folder.code as a string, list or null, participants null or empty,
+    feedback null, instructors (including students marked as their own
+    instructor), unweighted tasks and mixed mark formats.
+
+    Args:
+        tasks (int): Number of tasks
+        students (int): Number of students across years 7 to 13
+        class_size (int, optional): Participants per task. Defaults to 25.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        List[dict]: Task JSON, in the same format as the API
+    """
+    rng = random.Random(seed)
+    learners = make_students(students, rng)
+    by_year = {year: learners[i :: len(YEARS)] for i, year in enumerate(YEARS)}
+    teacher = {"id": "1", "externalId": "T001"}
+    first_day = date(2024, 1, 29)
+
+    data = []
+    for i in range(tasks):
+        year = rng.choice(YEARS)
+        subject = rng.choice(SUBJECTS)
+        group = rng.randint(1, 6)
+        code = f"{year}{subject}{group}"
+        roll = rng.random()
+        if roll < 0.1:
+            code = [code, f"{year}{subject}{group + 6}"]
+        elif roll < 0.12:
+            code = None
+
+        due = first_day + timedelta(days=rng.randint(0, 300))
+        # Daylight savings ends in April and starts in October
+        offset = "+10:00" if 4 <= due.month < 10 else "+11:00"
+
+        title = f"{subject} Task {i}"
+        if rng.random() < 0.2:
+            title += " {Semester 1}"
+        if rng.random() < 0.05:
+            title += "  MODIFIED "
+
+        out_of = rng.choice([None, 20, 50, 55, 100])
+        pool = by_year[year]
+        participants = []
+        for learner in rng.sample(pool, min(class_size, len(pool))):
+            feedback = None
+            if rng.random() > 0.05:
+                feedback = {
+                    "mark": make_mark(out_of, rng),
+                    "comment": rng.choice(["", "", "Well done.", "See me."]),
+                    "instructor": teacher if rng.random() < 0.5 else None,
+                }
+                if rng.random() < 0.005:
+                    # students occasionally mark themselves
+                    feedback["instructor"] = learner
+            participants.append(
+                {
+                    "learner": learner,
+                    "instructor": teacher if rng.random() < 0.3 else None,
+                    "feedback": feedback,
+                }
+            )
+        if rng.random() < 0.02:
+            participants = rng.choice([None, []])
+
+        data.append(
+            {
+                "id": 500000 + i,
+                "title": title,
+                "assessmentType": rng.choice(["assignment", "test", "exam"]),
+                "commonAssessment": rng.random() < 0.3,
+                "workType": (
+                    None
+                    if rng.random() < 0.1
+                    else {"id": "3", "name": "Assessment task"}
+                ),
+                "folder": {
+                    "id": f"{year}{subject}{group}",
+                    "name": f"{year} {subject} Subject {group}{rng.choice('ABC')}",
+                    "code": code,
+                    "yearLevel": [{"id": year, "name": str(year)}],
+                },
+                "subjectCode": subject,
+                "project": "",
+                "weight": rng.choice([0, 5, 10, 20, 25]),
+                "dueDate": f"{due.isoformat()}T09:00:00{offset}",
+                "participants": participants,
+            }
+        )
+    return data
+
+
+def make_pages(data: List[dict], limit: int = 500) -> List[dict]:
+    """Split tasks into API pages with cursor metadata.
+
+    Args:
+        data (List[dict]): Tasks from make_tasks
+        limit (int, optional): Tasks per page. Defaults to 500.
+
+    Returns:
+        List[dict]: Pages, in the same format as the API responses
+    """
+    pages = []
+    for start in range(0, max(len(data), 1), limit):
+        end = start + limit
+        pages.append(
+            {
+                "data": data[start:end],
+                "metadata": {
+                    "cursor": str(end) if end < len(data) else None,
+                    "count": len(data),
+                },
+            }
+        )
+    return pages
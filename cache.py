@@ -0,0 +1,154 @@
+"""
+On-disk cache of API responses, so repeated exports of the same window
+don't download everything again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+
+class CachedResponse:
+    """
+    A response read back from the cache, with the parts of
+    requests.Response that the fetch code uses.
+    """
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ResponseCache:
+    """
+    Stores successful responses on disk, keyed by host, filter, limit and cursor.
+    Entries older than `ttl` seconds are ignored, and the least recently used
+    entries are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str, ttl: float, max_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.refresh = False
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def path(self, host: str, params: Dict[str, str | int]) -> str:
+        key = json.dumps([host, sorted(params.items())], default=str)
+        digest = hashlib.sha256(key.encode("UTF-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def get(self, host: str, params: Dict[str, str | int]) -> CachedResponse | None:
+        """Look up a fresh response for a request.
+
+        Args:
+            host (str): Host URL
+            params (Dict[str, str | int]): Parameters for the request
+
+        Returns:
+            CachedResponse | None: The cached response, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        path = self.path(host, params)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if self.refresh or age > self.ttl:
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="UTF-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            # Mark as recently used, so it is evicted last. Under the lock, as
+            # evict() may have removed it since it was read.
+            try:
+                os.utime(path, (time.time(), os.path.getmtime(path)))
+            except FileNotFoundError:
+                pass
+            self.hits += 1
+        return CachedResponse(entry["status_code"], entry["text"])
+
+    def put(self, host: str, params: Dict[str, str | int], response) -> None:
+        """Store a response, evicting old entries if the cache is too large.
+
+        Args:
+            host (str): Host URL
+            params (Dict[str, str | int]): Parameters for the request
+            response (requests.Response): Response to store
+        """
+        if not self.enabled:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(host, params)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "w", encoding="UTF-8") as f:
+            json.dump({"status_code": response.status_code, "text": response.text}, f)
+        os.replace(temp, path)
+
+        with self.lock:
+            self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """Get the cache shared by every fetch path, creating it on first use.
+
+    The directory, time to live in seconds and maximum size in megabytes are
+    read from the CACHE_DIR, CACHE_TTL and CACHE_MAX_MB environment variables.
+    The cache is off unless CACHE_TTL is set above 0, as cached pages hide
+    changes made since and keep student names, marks and comments on disk.
+
+    Returns:
+        ResponseCache: The shared cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                os.getenv("CACHE_DIR", ".cache"),
+                float(os.getenv("CACHE_TTL", "0")),
+                int(float(os.getenv("CACHE_MAX_MB", "500")) * 1024 * 1024),
+            )
+        return _cache
@@ -0,0 +1,222 @@
+"""
+Shared HTTP client used for every request to the API.
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Client:
+    """
+    A pooled, retrying wrapper around requests.Session.
+    Connections are kept alive between pages, and failed requests are retried
+    with exponential backoff and jitter. Requests can be capped to a rate.
+    When the server pushes back with 429 or 503 and a Retry-After header, no
+    request goes out on the client until that time has passed, unless it is
+    longer than `max_retry_after`, which fails the request instead.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        timeout: float = 30,
+        retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        rate: float = 0,
+        max_retry_after: float = 60,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+        self.throttled = 0
+
+        # Requests per second, 0 for no limit. Each request reserves the next
+        # free slot, so threads sharing the client space themselves out.
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = time.monotonic()
+        # Set by Retry-After, nothing is sent before this time
+        self.resume_at = 0.0
+
+    def wait_for_slot(self) -> None:
+        """Sleep until this request is allowed under the rate limit and any
+        Retry-After the server asked for."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.resume_at)
+            if self.interval:
+                slot = max(slot, self.next_slot)
+                self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def get(
+        self, url: str, params: Dict[str, str | int], headers: Dict[str, str]
+    ) -> requests.Response:
+        """Send a GET request, retrying on connection errors, 5xx and 429 responses.
+
+        Args:
+            url (str): URL to request
+            params (Dict[str, str | int]): Query parameters
+            headers (Dict[str, str]): Headers for the request
+
+        Returns:
+            requests.Response: Response from the API, the last one if every attempt failed
+        """
+        attempt = 0
+        while True:
+            self.wait_for_slot()
+            try:
+                response = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            else:
+                throttled = response.status_code in (429, 503)
+                with self.lock:
+                    self.requests += 1
+                    self.throttled += throttled
+                if (
+                    response.status_code < 500 and not throttled
+                ) or attempt >= self.retries:
+                    return response
+                wait = retry_after(response) if throttled else None
+                # Rather fail than stall every thread for as long as the server asks
+                if wait is not None and wait > self.max_retry_after:
+                    return response
+                response.close()
+                if wait is not None:
+                    # Hold back every thread using the client, not just this one
+                    with self.lock:
+                        self.retried += 1
+                        self.resume_at = max(self.resume_at, time.monotonic() + wait)
+                    attempt += 1
+                    continue
+
+            with self.lock:
+                self.retried += 1
+            time.sleep(self.delay(attempt))
+            attempt += 1
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before the next attempt, using full jitter.
+
+        Args:
+            attempt (int): Number of attempts that have failed so far, minus one
+
+        Returns:
+            float: Seconds to sleep
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def stats(self) -> Dict[str, int]:
+        """Count requests, new connections, reused connections and retries.
+
+        Returns:
+            Dict[str, int]: Connection and retry counters
+        """
+        opened = 0
+        poolmanager = self.adapter.poolmanager
+        for key in list(poolmanager.pools.keys()):
+            pool = poolmanager.pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+
+        return {
+            "requests": self.requests,
+            "connections_opened": opened,
+            "connections_reused": max(0, self.requests - opened),
+            "retries": self.retried,
+            "throttled": self.throttled,
+        }
+
+
+def retry_after(response: requests.Response) -> float | None:
+    """Read how long the server asked us to wait from a Retry-After header.
+
+    Args:
+        response (requests.Response): 429 or 503 response
+
+    Returns:
+        float | None: Seconds to wait, or None if the header is missing or invalid
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+_client: Client | None = None
+_host_clients: Dict[str, Client] = {}
+_client_lock = threading.Lock()
+
+
+def set_host_client(host: str, client: Client) -> None:
+    """Give a host its own client, so it has its own connection pool and rate limit.
+
+    Args:
+        host (str): Host URL, as passed to make_request
+        client (Client): Client to use for every request to the host
+    """
+    with _client_lock:
+        _host_clients[host] = client
+
+
+def get_client(host: str | None = None) -> Client:
+    """Get the client for a host, or the one shared by every fetch path, creating
+    it on first use.
+
+    Pool size, timeout, retry count and longest Retry-After to wait for are read
+    from the HTTP_POOL_SIZE, HTTP_TIMEOUT, HTTP_RETRIES and HTTP_MAX_RETRY_AFTER
+    environment variables.
+
+    Args:
+        host (str, optional): Host URL, used if it was given a client of its own.
+            Defaults to None.
+
+    Returns:
+        Client: The client for the host, or the shared client
+    """
+    global _client
+    with _client_lock:
+        if host in _host_clients:
+            return _host_clients[host]
+        if _client is None:
+            _client = Client(
+                pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")),
+                timeout=float(os.getenv("HTTP_TIMEOUT", "30")),
+                retries=int(os.getenv("HTTP_RETRIES", "5")),
+                max_retry_after=float(os.getenv("HTTP_MAX_RETRY_AFTER", "60")),
+            )
+        return _client
@@ -0,0 +1,65 @@
+"""
+Progress spinners and bars for interactive runs.
+The progress library is only imported when output goes to a terminal, so
+headless runs (e.g. from cron) start faster and don't fill logs.
+"""
+
+import sys
+
+
+class Silent:
+    """
+    Stands in for a spinner or bar when nothing should be displayed.
+    """
+
+    def next(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+_silenced = False
+
+
+def silence() -> None:
+    """Stop showing progress, e.g. while several exports share the terminal."""
+    global _silenced
+    _silenced = True
+
+
+def interactive() -> bool:
+    return not _silenced and sys.stdout.isatty()
+
+
+def spinner(message: str):
+    """Create a spinner, or a silent stand-in if not running in a terminal.
+
+    Args:
+        message (str): Message shown next to the spinner
+
+    Returns:
+        Spinner | Silent: Object with next() and finish()
+    """
+    if not interactive():
+        return Silent()
+    from progress.spinner import Spinner  # pylint: disable=import-outside-toplevel
+
+    return Spinner(message)
+
+
+def bar(message: str, max_value: int):
+    """Create a progress bar, or a silent stand-in if not running in a terminal.
+
+    Args:
+        message (str): Message shown next to the bar
+        max_value (int): Number of steps
+
+    Returns:
+        Bar | Silent: Object with next() and finish()
+    """
+    if not interactive():
+        return Silent()
+    from progress.bar import Bar  # pylint: disable=import-outside-toplevel
+
+    return Bar(message, max=max_value)
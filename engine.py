@@ -0,0 +1,235 @@
+"""
+asyncio fetch engine that follows many API cursor chains at once under a
+single concurrency limit, with a synchronous wrapper for the rest of the
+program. The limit and page size can instead be adapted to the server's
+pushback by an AdaptiveController.
+"""
+
+import asyncio
+import concurrent.futures
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Tuple
+
+from adaptive import AdaptiveController
+from input import make_request
+from metrics import get_metrics
+from stream import prefetch
+
+_CHAIN_DONE = object()
+
+
+def _request_page(
+    host: str, params: Dict[str, str | int], headers: Dict[str, str]
+) -> Tuple[int, str, dict | None]:
+    # Decode on the worker thread too, so the event loop only schedules
+    req = make_request(host, params, headers)
+    if req.status_code != 200:
+        return req.status_code, req.text, None
+    with get_metrics().stage("json_decode"):
+        return req.status_code, "", req.json()
+
+
+async def fetch_chain(
+    host: str,
+    params: Dict[str, str | int],
+    headers: Dict[str, str],
+    semaphore: asyncio.Semaphore,
+    executor: concurrent.futures.Executor,
+    controller: AdaptiveController | None = None,
+    query: int = 0,
+) -> AsyncIterator[dict]:
+    """Follow one query's cursor, yielding each page as it arrives.
+
+    Requests go through make_request on the executor, so they share the
+    pooled client and response cache with the synchronous fetch path.
+
+    Args:
+        host (str): Host URL
+        params (Dict[str, str | int]): Parameters for the first page
+        headers (Dict[str, str]): Headers for the request
+        semaphore (asyncio.Semaphore): Limits requests in flight across all chains
+        executor (concurrent.futures.Executor): Runs the blocking requests
+        controller (AdaptiveController, optional): Limits requests in flight and sets
+            the page size instead of the semaphore. Defaults to None.
+        query (int, optional): Index of the query, for the controller's log.
+            Defaults to 0.
+
+    Raises:
+        ValueError: The API returned a non-200 status code
+
+    Yields:
+        dict: Each page of the response, including its metadata
+    """
+    loop = asyncio.get_running_loop()
+    params = dict(params)
+    fetched = 0
+    while True:
+        if controller is None:
+            async with semaphore:
+                status, text, current = await loop.run_in_executor(
+                    executor, _request_page, host, dict(params), headers
+                )
+        else:
+            async with controller.slot():
+                # The cursor is opaque, so a chain keeps the page size it started with
+                if "cursor" not in params:
+                    params["limit"] = controller.limit
+                sent = time.monotonic()
+                status, text, current = await loop.run_in_executor(
+                    executor, _request_page, host, dict(params), headers
+                )
+                controller.record(
+                    query,
+                    sent,
+                    time.monotonic() - sent,
+                    status,
+                    len(current["data"]) if current is not None else 0,
+                )
+        if status != 200:
+            raise ValueError(f"API returned status {status}: {text}")
+
+        fetched += len(current["data"])
+        yield current
+
+        if current["metadata"]["cursor"] is None:
+            break
+        params["cursor"] = current["metadata"]["cursor"]
+
+    assert fetched == current["metadata"]["count"]
+
+
+async def fetch_queries_async(
+    host: str,
+    headers: Dict[str, str],
+    queries: List[Dict[str, str | int]],
+    concurrency: int,
+    controller: AdaptiveController | None = None,
+) -> AsyncIterator[Tuple[int, dict]]:
+    """Run every query's cursor chain concurrently, yielding pages as they complete.
+
+    Args:
+        host (str): Host URL
+        headers (Dict[str, str]): Headers for the request
+        queries (List[Dict[str, str | int]]): Parameters for the first page of each query
+        concurrency (int): Maximum number of requests in flight across all queries
+        controller (AdaptiveController, optional): Adapts the requests in flight and
+            page size instead, up to its own maximum. Defaults to None.
+
+    Yields:
+        Tuple[int, dict]: Index of the query in `queries` and one of its pages
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    pages: asyncio.Queue = asyncio.Queue()
+
+    threads = concurrency if controller is None else controller.max_concurrency
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+
+        async def run(index: int, params: Dict[str, str | int]) -> None:
+            try:
+                async for page in fetch_chain(
+                    host, params, headers, semaphore, executor, controller, index
+                ):
+                    await pages.put((index, page))
+            except Exception as error:  # pylint: disable=broad-except
+                await pages.put((index, error))
+            await pages.put((index, _CHAIN_DONE))
+
+        tasks = [
+            asyncio.create_task(run(index, params))
+            for index, params in enumerate(queries)
+        ]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                index, page = await pages.get()
+                if page is _CHAIN_DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                yield index, page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _run_async_iterator(make_iterator) -> Iterator:
+    loop = asyncio.new_event_loop()
+    iterator = make_iterator()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(iterator.aclose())
+        loop.close()
+
+
+def iter_queries(
+    host: str,
+    headers: Dict[str, str],
+    queries: List[Dict[str, str | int]],
+    concurrency: int = 8,
+    controller: AdaptiveController | None = None,
+) -> Iterator[Tuple[int, dict]]:
+    """Synchronous wrapper around fetch_queries_async.
+
+    The event loop runs in a background thread, so requests keep flowing
+    while the caller works on the pages already received.
+
+    Args:
+        host (str): Host URL
+        headers (Dict[str, str]): Headers for the request
+        queries (List[Dict[str, str | int]]): Parameters for the first page of each query
+        concurrency (int, optional): Maximum requests in flight. Defaults to 8.
+        controller (AdaptiveController, optional): Adapts the requests in flight and
+            page size instead. Defaults to None.
+
+    Yields:
+        Tuple[int, dict]: Index of the query in `queries` and one of its pages
+    """
+    return prefetch(
+        _run_async_iterator(
+            lambda: fetch_queries_async(host, headers, queries, concurrency, controller)
+        ),
+        depth=concurrency,
+    )
+
+
+def fetch_queries(
+    host: str,
+    headers: Dict[str, str],
+    queries: List[Dict[str, str | int]],
+    concurrency: int = 8,
+    spinner=None,
+    on_page: Callable[[int, dict], None] | None = None,
+    controller: AdaptiveController | None = None,
+) -> List[list[dict]]:
+    """Fetch every page of several queries concurrently.
+
+    Args:
+        host (str): Host URL
+        headers (Dict[str, str]): Headers for the request
+        queries (List[Dict[str, str | int]]): Parameters for the first page of each query
+        concurrency (int, optional): Maximum requests in flight. Defaults to 8.
+        spinner (Spinner | Silent, optional): Advanced once per page. Defaults to None.
+        on_page (Callable[[int, dict], None], optional): Called with the query index
+            and each page as it arrives, e.g. to archive it. Defaults to None.
+        controller (AdaptiveController, optional): Adapts the requests in flight and
+            page size instead. Defaults to None.
+
+    Returns:
+        List[list[dict]]: Assessments returned for each query, in page order
+    """
+    results: List[List[dict]] = [[] for _ in queries]
+    # Pages of one query arrive in cursor order, as each chain is sequential
+    for index, page in iter_queries(host, headers, queries, concurrency, controller):
+        results[index].extend(page["data"])
+        if on_page is not None:
+            on_page(index, page)
+        if spinner is not None:
+            spinner.next()
+    return results
@@ -2,42 +2,133 @@
 Takes a Result object and generates a CSV files for tasks and marks.
 """
 
+import concurrent.futures
 import csv
-import re
-import sys
-from typing import List
+import glob
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from ledger import Ledger
+from metrics import get_metrics
+from model import (
+    FRACTION,
+    NOT_ASSESSED,
+    PERCENTAGE,
+    UNKNOWN,
+    Assessment,
+    AssessmentView,
+    Participant,
+)
+from output import open_table
+from process import normalize
+
+
+def remove_report(filename: str) -> None:
+    """Remove a report left by an earlier run, so it isn't taken as this run's.
 
-from model import Assessment, Participant
+    Args:
+        filename (str): Name of the report file
+    """
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
 
 
-def generate_assessments_simple_csv(
-    assessments: List["Assessment"], year_group: int, start_date: str, end_date: str
+def write_conflicts(
+    filename: str, header: List[str], conflicts: List[Tuple[tuple, tuple]]
 ) -> None:
-    with open(
-        f"{year_group}_{start_date}_{end_date}_tasks.csv",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as tasks_file:
-        writer = csv.writer(tasks_file, delimiter=",")
-        writer.writerow(
-            [
-                "course",
-                "folder_code",
-                "title",
-                "work_type",
-                "assessment_type",
-                "due_date",
-                "weight",
-            ]
-        )
-        assessment: Assessment
-        for assessment in assessments:
-            # example course name "9 My Subject Name 1C", remove " 1C"
-            course = " ".join(assessment.folder.name.split(" ")[:-1])
+    """Write every conflicting pair of rows found by a generator to a report.
+    No file is written if there were no conflicts, and an earlier one is removed.
+
+    Args:
+        filename (str): Name of the report file
+        header (List[str]): Names of the columns in each row
+        conflicts (List[Tuple[tuple, tuple]]): The row that was written and the row skipped
+    """
+    if not conflicts:
+        remove_report(filename)
+        return
+
+    with open(filename, "w", newline="", encoding="UTF-8") as conflicts_file:
+        writer = csv.writer(conflicts_file, delimiter=",")
+        writer.writerow(["status"] + header)
+        for written_row, skipped_row in conflicts:
+            writer.writerow(["written"] + list(written_row))
+            writer.writerow(["skipped"] + list(skipped_row))
+
+    print(f"{len(conflicts)} conflicting rows skipped, see {filename}")
+
+
+def delta_run(prefix: str) -> str:
+    """Name the files of a delta export, so a rerun can't overwrite a delta
+    that hasn't been imported yet.
+
+    Args:
+        prefix (str): Path and name the full export's files start with
+
+    Returns:
+        str: Timestamp no earlier delta export for the prefix used
+    """
+    run = datetime.now().strftime("%Y%m%d-%H%M%S")
+    stamp, n = run, 1
+    while glob.glob(f"{glob.escape(f'{prefix}_delta_{run}')}_*"):
+        n += 1
+        run = f"{stamp}-{n}"
+    return run
+
 
+def write_removed(filename: str, header: List[str], removed: List[tuple]) -> None:
+    """Write the rows a delta export found had been removed since the last export.
+    No file is written if nothing was removed, and an earlier one is removed.
+
+    Args:
+        filename (str): Name of the report file
+        header (List[str]): Names of the key columns
+        removed (List[tuple]): Key fields of each removed row
+    """
+    if not removed:
+        remove_report(filename)
+        return
+
+    with open(filename, "w", newline="", encoding="UTF-8") as removed_file:
+        writer = csv.writer(removed_file, delimiter=",")
+        writer.writerow(header)
+        writer.writerows(removed)
+
+    get_metrics().written(filename, len(removed))
+    print(f"{len(removed)} rows removed since the last export, see {filename}")
+
+
+def generate_assessments_simple_csv(
+    views: Iterable["AssessmentView"],
+    year_group: int,
+    start_date: str,
+    end_date: str,
+    output_dir: str = ".",
+) -> int:
+    tasks_file, writer = open_table(
+        os.path.join(output_dir, f"{year_group}_{start_date}_{end_date}_tasks.csv"),
+        ",",
+        [
+            "course",
+            "folder_code",
+            "title",
+            "work_type",
+            "assessment_type",
+            "due_date",
+            "weight",
+        ],
+    )
+    try:
+        rows = 0
+        view: AssessmentView
+        for view in views:
+            assessment = view.assessment
             row = [
-                course,
+                view.course,
                 assessment.folder.code,
                 assessment.title,
                 assessment.work_type,
@@ -47,292 +138,416 @@ def generate_assessments_simple_csv(
             ]
 
             writer.writerow(row)
+            rows += 1
+    finally:
+        tasks_file.close()
+
+    get_metrics().written(tasks_file.name, rows)
+    return rows
+
+
+TASKS_HEADER = [
+    "coursework_task",
+    "task_kind",
+    "coursework_category",
+    "description",
+    "academic_year",  # year in which the assessment is given
+    "course",
+    "weighting",
+    "mark_out_of",
+    "dmy_set_date",
+    "dmy_due_date",
+    "into_markbook_flag",
+    "record_marks_flag",
+    "grade_only",
+    "criteria_only",
+    "status_flag",
+    "release_marks_flag",
+    "task_dropdown_flag",
+    "do_not_allow_comments",
+]
+
+MARKS_HEADER = [
+    "student_number",
+    "coursework_task",
+    "raw_mark",
+    "raw_mark_date",  # date in which the mark was given
+    "course",
+    "academic_year",
+]
+
+
+class TasksSink:
+    """
+    Writes tasks to tasks.txt and modified_tasks.csv, one assessment at a time.
+    With delta set, only tasks that are new or changed since the last delta
+    export are written, and removed tasks are listed in removed_tasks.csv,
+    all named after the run (see delta_run).
+    """
 
+    def __init__(
+        self,
+        year_group: int,
+        start_date: str,
+        end_date: str,
+        output_dir: str = ".",
+        delta: bool = False,
+        run: str | None = None,
+    ):
+        self.prefix = os.path.join(output_dir, f"{year_group}_{start_date}_{end_date}")
+        if delta:
+            self.prefix += f"_delta_{run or delta_run(self.prefix)}"
+        self.rows = 0
+        self.written_rows: Dict[tuple, tuple] = {}
+        self.conflicts: List[Tuple[tuple, tuple]] = []
+        self.ledger = (
+            Ledger(f"{year_group}:tasks", start_date, end_date) if delta else None
+        )
 
-def generate_assessments_csv(
-    assessments: List["Assessment"], year_group: int, start_date: str, end_date: str
-) -> None:
-    """Generate a CSV file for tasks.
+    def __enter__(self) -> "TasksSink":
+        self.tasks_file, self.writer = open_table(
+            f"{self.prefix}_tasks.txt", "\t", TASKS_HEADER
+        )
+        self.modified_tasks_file, self.modified_writer = open_table(
+            f"{self.prefix}_modified_tasks.csv", ",", TASKS_HEADER
+        )
+        self.file_rows = {self.tasks_file.name: 0, self.modified_tasks_file.name: 0}
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.tasks_file.close()
+        self.modified_tasks_file.close()
+        for filename, rows in self.file_rows.items():
+            get_metrics().written(filename, rows)
+        write_conflicts(
+            f"{self.prefix}_task_conflicts.csv", TASKS_HEADER[:8], self.conflicts
+        )
+        if self.ledger is not None and exc_type is None:
+            write_removed(
+                f"{self.prefix}_removed_tasks.csv",
+                ["coursework_task", "course"],
+                self.ledger.removed(),
+            )
+            get_metrics().count("rows_unchanged", self.ledger.unchanged)
+            self.ledger.commit()
+
+    def write(self, view: AssessmentView) -> None:
+        if view.mark_out_of == "Not Assessed":
+            # skip assessment if no students have a mark
+            return
+
+        row = [
+            view.title,
+            "Test / Examination",  # task kind, read documentation
+            "Coursework / IA",  # coursework category, read documentation
+            "",  # description
+            view.academic_year,
+            view.course,
+            view.assessment.weight,
+            view.mark_out_of,
+        ]
+        row_tuple = tuple(row)
+
+        # (title, course) -> row already written for that task
+        key = (row_tuple[0], row_tuple[5])
+        written_row = self.written_rows.get(key)
+        if written_row is not None:
+            if row_tuple != written_row:
+                print("Non-perfect task match found, skipping duplicate task: ")
+                print("title, kind, category, year, course, weight")
+                print(row_tuple)
+                print(written_row)
+                self.conflicts.append((written_row, row_tuple))
+            return
+
+        output = row + [
+            view.assessment.due_date,  # set date, for now just using the due date
+            view.assessment.due_date,
+            1,  # Set to 1 if you want task to appear in the markbook
+            1,  # Set to 1 to record marks for this task
+            0,  # Set to 1 if you only want record grades.
+            0,  # Set to 1 to record criteria only.
+            0,  # Set to 1 to not show this task in the portal
+            0,  # Set to 0 if you want task marks / results to appear on the portal
+            0,  # Set to 1 to allow online submission to the dropdown box
+            0,  # Set to 1 to check the do not allow comments in markbook dropdown box
+        ]
 
-    Args:
-        assessments (List["Assessment"]): List of assessments
-        year_group (int): Year group to put in the filename
-        start_date (str): Start date to put in the filename
-        end_date (str): End date to put in the filename
-    """
+        if self.ledger is not None and not self.ledger.changed(
+            key, tuple(output), view.assessment.due_date
+        ):
+            self.written_rows[key] = row_tuple
+            return
 
-    with open(
-        f"{year_group}_{start_date}_{end_date}_tasks.txt",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as tasks_file, open(
-        f"{year_group}_{start_date}_{end_date}_modified_tasks.csv",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as modified_tasks_file:
-        writer = csv.writer(tasks_file, delimiter="\t")
-        modified_writer = csv.writer(modified_tasks_file, delimiter=",")
-        written_rows = set()
-        header = [
-            "coursework_task",
-            "task_kind",
-            "coursework_category",
-            "description",
-            "academic_year",  # year in which the assessment is given
-            "course",
-            "weighting",
-            "mark_out_of",
-            "dmy_set_date",
-            "dmy_due_date",
-            "into_markbook_flag",
-            "record_marks_flag",
-            "grade_only",
-            "criteria_only",
-            "status_flag",
-            "release_marks_flag",
-            "task_dropdown_flag",
-            "do_not_allow_comments",
-        ]
+        if view.modified:
+            self.modified_writer.writerow(output)
+            self.file_rows[self.modified_tasks_file.name] += 1
+        else:
+            self.writer.writerow(output)
+            self.file_rows[self.tasks_file.name] += 1
+        self.written_rows[key] = row_tuple
+        self.rows += 1
 
-        writer.writerow(header)
-        modified_writer.writerow(header)
-        assessment: Assessment
-        for assessment in assessments:
-            # assessment.participants contains all students,
-            # which have a mark in the format "X / Y" or "X %" or "Not Assessed"
-            mark = "Not Assessed"
-            for participant in assessment.participants:
-                if " %" in participant.mark:
-                    mark = "100"
-                    break
-                if " / " in participant.mark:
-                    mark = participant.mark.split(" / ")[1]
-                    break
-
-            if mark == "Not Assessed":
-                # skip assessment if no students have a mark
-                continue
 
-            # example course name "9 My Subject Name 1C", remove " 1C"
-            course = " ".join(assessment.folder.name.split(" ")[:-1])
+class MarksSink:
+    """
+    Writes marks to marks.txt, modified_marks.csv and not_assessed_marks.csv,
+    one assessment at a time. With delta set, only marks that are new or
+    changed since the last delta export are written, and removed marks are
+    listed in removed_marks.csv, all named after the run (see delta_run).
+    """
+
+    def __init__(
+        self,
+        year_group: int,
+        start_date: str,
+        end_date: str,
+        output_dir: str = ".",
+        delta: bool = False,
+        run: str | None = None,
+    ):
+        self.prefix = os.path.join(output_dir, f"{year_group}_{start_date}_{end_date}")
+        if delta:
+            self.prefix += f"_delta_{run or delta_run(self.prefix)}"
+        self.rows = 0
+        self.written_rows: Dict[tuple, tuple] = {}
+        self.conflicts: List[Tuple[tuple, tuple]] = []
+        self.ledger = (
+            Ledger(f"{year_group}:marks", start_date, end_date) if delta else None
+        )
 
-            # filter out any text enclosed in curly braces from the title using regex
-            # remove any double spaces
-            # remove any leading or trailing whitespace
-            title = re.sub(r"\{.*?\}", "", assessment.title)
-            title = re.sub(r"\s+", " ", title)
-            title = title.strip()
+    def __enter__(self) -> "MarksSink":
+        named_header = (
+            MARKS_HEADER[0:1] + ["First Name", "Last Name"] + MARKS_HEADER[1:]
+        )
+        self.marks_file, self.writer = open_table(
+            f"{self.prefix}_marks.txt", "\t", MARKS_HEADER
+        )
+        self.modified_marks_file, self.modified_writer = open_table(
+            f"{self.prefix}_modified_marks.csv", ",", named_header
+        )
+        self.not_assessed_file, self.not_assessed_writer = open_table(
+            f"{self.prefix}_not_assessed_marks.csv", ",", named_header
+        )
+        self.file_rows = {
+            self.marks_file.name: 0,
+            self.modified_marks_file.name: 0,
+            self.not_assessed_file.name: 0,
+        }
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.marks_file.close()
+        self.modified_marks_file.close()
+        self.not_assessed_file.close()
+        for filename, rows in self.file_rows.items():
+            get_metrics().written(filename, rows)
+        write_conflicts(
+            f"{self.prefix}_mark_conflicts.csv", MARKS_HEADER, self.conflicts
+        )
+        if self.ledger is not None and exc_type is None:
+            write_removed(
+                f"{self.prefix}_removed_marks.csv",
+                ["student_number", "coursework_task", "course"],
+                self.ledger.removed(),
+            )
+            get_metrics().count("rows_unchanged", self.ledger.unchanged)
+            self.ledger.commit()
+
+    def write(self, view: AssessmentView) -> None:
+        participant: Participant
+        for participant in view.assessment.participants:
+            if participant.mark.kind == UNKNOWN:
+                # what?
+                continue
+            not_assessed = participant.mark.kind == NOT_ASSESSED
 
             row = [
-                title,
-                "Test / Examination",  # task kind, read documentation
-                "Coursework / IA",  # coursework category, read documentation
-                "",  # description
-                # get year from due date in format 2022-03-09
-                assessment.due_date.split("-")[0],
-                course,
-                assessment.weight,
-                mark,
+                participant.external_id,
+                view.title,
+                # take mark from "43 / 55" to 43
+                participant.mark.raw,
+                view.assessment.due_date,
+                view.course,
+                view.academic_year,
             ]
             row_tuple = tuple(row)
 
-            duplicate = False
-            for written_row in written_rows:
-                if row_tuple == written_row:
-                    duplicate = True
-                    continue
-                if row_tuple[0] == written_row[0] and row_tuple[5] == written_row[5]:
-                    print("Non-perfect task match found, skipping duplicate task: ")
-                    print("title, kind, category, year, course, weight")
+            # (student, title, course) -> row already written for that mark
+            key = (row_tuple[0], row_tuple[1], row_tuple[4])
+            written_row = self.written_rows.get(key)
+            if written_row is not None:
+                if row_tuple != written_row:
+                    print("Non-perfect mark match found, skipping duplicate mark: ")
+                    print("student, title, mark, date, course, year")
                     print(row_tuple)
                     print(written_row)
-                    sys.exit(1)
-
-            if duplicate:
+                    self.conflicts.append((written_row, row_tuple))
                 continue
 
-            output = row + [
-                assessment.due_date,  # set date, for now just using the due date
-                assessment.due_date,
-                1,  # Set to 1 if you want task to appear in the markbook
-                1,  # Set to 1 to record marks for this task
-                0,  # Set to 1 if you only want record grades.
-                0,  # Set to 1 to record criteria only.
-                0,  # Set to 1 to not show this task in the portal
-                0,  # Set to 0 if you want task marks / results to appear on the portal
-                0,  # Set to 1 to allow online submission to the dropdown box
-                0,  # Set to 1 to check the do not allow comments in markbook dropdown box
-            ]
+            if self.ledger is not None and not self.ledger.changed(
+                key, row_tuple, view.assessment.due_date
+            ):
+                self.written_rows[key] = row_tuple
+                continue
 
-            if "MODIFIED" in title.upper():
-                modified_writer.writerow(output)
+            if not_assessed:
+                self.not_assessed_writer.writerow(
+                    row[0:1] + [participant.first_name, participant.last_name] + row[1:]
+                )
+                self.file_rows[self.not_assessed_file.name] += 1
+            elif view.modified:
+                self.modified_writer.writerow(
+                    row[0:1] + [participant.first_name, participant.last_name] + row[1:]
+                )
+                self.file_rows[self.modified_marks_file.name] += 1
             else:
-                writer.writerow(output)
-            written_rows.add(row_tuple)
+                self.writer.writerow(row)
+                self.file_rows[self.marks_file.name] += 1
+            self.written_rows[key] = row_tuple
+            self.rows += 1
+
+
+def generate_assessments_csv(
+    views: Iterable["AssessmentView"],
+    year_group: int,
+    start_date: str,
+    end_date: str,
+    output_dir: str = ".",
+    delta: bool = False,
+) -> int:
+    """Generate a CSV file for tasks.
+
+    Args:
+        views (Iterable["AssessmentView"]): Normalized assessments, iterated once
+        year_group (int): Year group to put in the filename
+        start_date (str): Start date to put in the filename
+        end_date (str): End date to put in the filename
+        output_dir (str, optional): Directory to write to. Defaults to ".".
+        delta (bool, optional): Only write rows that are new or changed since the last
+            delta export. Defaults to False.
+
+    Returns:
+        int: Number of rows written, excluding headers
+    """
+
+    with TasksSink(year_group, start_date, end_date, output_dir, delta) as tasks:
+        for view in views:
+            tasks.write(view)
+    return tasks.rows
 
 
 def generate_marks_csv(
-    assessments: List["Assessment"], year_group: int, start_date: str, end_date: str
-) -> None:
+    views: Iterable["AssessmentView"],
+    year_group: int,
+    start_date: str,
+    end_date: str,
+    output_dir: str = ".",
+    delta: bool = False,
+) -> int:
     """Generate a CSV file for marks.
 
     Args:
-        assessments (List["Assessment"]): List of assessments
+        views (Iterable["AssessmentView"]): Normalized assessments, iterated once
         year_group (int): Year group to put in the filename
         start_date (str): Start date to put in the filename
         end_date (str): End date to put in the filename
+        output_dir (str, optional): Directory to write to. Defaults to ".".
+        delta (bool, optional): Only write rows that are new or changed since the last
+            delta export. Defaults to False.
+
+    Returns:
+        int: Number of rows written, excluding headers
     """
 
-    with open(
-        f"{year_group}_{start_date}_{end_date}_marks.txt",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as marks_file, open(
-        f"{year_group}_{start_date}_{end_date}_modified_marks.csv",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as modified_marks_file, open(
-        f"{year_group}_{start_date}_{end_date}_not_assessed_marks.csv",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as not_assessed_file:
-        writer = csv.writer(marks_file, delimiter="\t")
-        modified_writer = csv.writer(modified_marks_file, delimiter=",")
-        not_assessed_writer = csv.writer(not_assessed_file, delimiter=",")
-        written_rows = set()
-        header = [
-            "student_number",
-            "coursework_task",
-            "raw_mark",
-            "raw_mark_date",  # date in which the mark was given
-            "course",
-            "academic_year",
-        ]
+    with MarksSink(year_group, start_date, end_date, output_dir, delta) as marks:
+        for view in views:
+            marks.write(view)
+    return marks.rows
 
-        writer.writerow(header)
-        modified_writer.writerow(header[0:1] + ["First Name", "Last Name"] + header[1:])
-        not_assessed_writer.writerow(
-            header[0:1] + ["First Name", "Last Name"] + header[1:]
-        )
-        for assessment in assessments:
-            participant: Participant
-            for participant in assessment.participants:
-                not_assessed = False
-                if " %" in participant.mark:
-                    # "86.42 %"
-                    mark = participant.mark.split(" %")[0]
-                elif " / " in participant.mark:
-                    # "43 / 55"
-                    mark = participant.mark.split(" / ")[0]
-                elif participant.mark == "Not Assessed":
-                    mark = participant.mark
-                    not_assessed = True
-                else:
-                    # what?
-                    continue
 
-                # example course name "9 My Subject Name 1C", remove " 1C"
-                course = " ".join(assessment.folder.name.split(" ")[:-1])
-
-                # filter out any text enclosed in curly braces from the title using regex
-                # remove any double spaces
-                # remove any leading or trailing whitespace
-                title = re.sub(r"\{.*?\}", "", assessment.title)
-                title = re.sub(r"\s+", " ", title)
-                title = title.strip()
-
-                row = [
-                    participant.external_id,
-                    title,
-                    # take mark from "43 / 55" to 43
-                    mark,
-                    assessment.due_date,
-                    course,
-                    # get year from due date in format 2022-03-09
-                    assessment.due_date.split("-")[0],
-                ]
-                row_tuple = tuple(row)
-
-                for written_row in written_rows:
-                    if row == written_row:
-                        continue
-                    if (
-                        row_tuple[0] == written_row[0]
-                        and row_tuple[1] == written_row[1]
-                        and row_tuple[4] == written_row[4]
-                    ):
-                        print("Non-perfect mark match found, skipping duplicate mark: ")
-                        print("student, title, mark, date, course, year")
-                        print(row_tuple)
-                        print(written_row)
-                        sys.exit(1)
-
-                if not_assessed:
-                    not_assessed_writer.writerow(
-                        row[0:1]
-                        + [participant.first_name, participant.last_name]
-                        + row[1:]
-                    )
-                elif "MODIFIED" in title.upper():
-                    modified_writer.writerow(
-                        row[0:1]
-                        + [participant.first_name, participant.last_name]
-                        + row[1:]
-                    )
-                else:
-                    writer.writerow(row)
-                written_rows.add(row_tuple)
+def generate_markbook_csv(
+    views: Iterable["AssessmentView"],
+    year_group: int,
+    start_date: str,
+    end_date: str,
+    output_dir: str = ".",
+    delta: bool = False,
+) -> int:
+    """Generate the CSV files for tasks and marks in a single pass.
+    The output is identical to generate_assessments_csv and generate_marks_csv.
+
+    Args:
+        views (Iterable["AssessmentView"]): Normalized assessments, iterated once
+        year_group (int): Year group to put in the filename
+        start_date (str): Start date to put in the filename
+        end_date (str): End date to put in the filename
+        output_dir (str, optional): Directory to write to. Defaults to ".".
+        delta (bool, optional): Only write rows that are new or changed since the last
+            delta export. Defaults to False.
+
+    Returns:
+        int: Number of rows written, excluding headers
+    """
+
+    run = None
+    if delta:
+        # Tasks and marks from one run share a name
+        run = delta_run(
+            os.path.join(output_dir, f"{year_group}_{start_date}_{end_date}")
+        )
+    with TasksSink(
+        year_group, start_date, end_date, output_dir, delta, run
+    ) as tasks, MarksSink(
+        year_group, start_date, end_date, output_dir, delta, run
+    ) as marks:
+        for view in views:
+            tasks.write(view)
+            marks.write(view)
+    return tasks.rows + marks.rows
 
 
 def generate_comments_csv(
-    assessments: List["Assessment"], year_group: int, start_date: str, end_date: str
-) -> None:
+    views: Iterable["AssessmentView"],
+    year_group: int,
+    start_date: str,
+    end_date: str,
+    output_dir: str = ".",
+) -> int:
     """Generate a CSV file for comments.
 
     Args:
-        assessments (List["Assessment"]): List of assessments
+        views (Iterable["AssessmentView"]): Normalized assessments, iterated once
         year_group (int): Year group to put in the filename
         start_date (str): Start date to put in the filename
         end_date (str): End date to put in the filename
+        output_dir (str, optional): Directory to write to. Defaults to ".".
+
+    Returns:
+        int: Number of rows written, excluding headers
     """
 
-    with open(
-        f"{year_group}_{start_date}_{end_date}_comments.csv",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as marks_file:
-        writer = csv.writer(marks_file, delimiter=",")
-        writer.writerow(
-            [
-                "student_number",
-                "course",
-                "coursework_task",
-                "raw_mark",
-                "comment",
-            ]
-        )
-        assessment: Assessment
-        for assessment in assessments:
+    marks_file, writer = open_table(
+        os.path.join(output_dir, f"{year_group}_{start_date}_{end_date}_comments.csv"),
+        ",",
+        [
+            "student_number",
+            "course",
+            "coursework_task",
+            "raw_mark",
+            "comment",
+        ],
+    )
+    try:
+        rows = 0
+        view: AssessmentView
+        for view in views:
             participant: Participant
-            for participant in assessment.participants:
-                if " %" in participant.mark:
-                    # "86.42 %"
-                    mark = participant.mark.split(" %")[0]
-                elif " / " in participant.mark:
-                    # "43 / 55"
-                    mark = participant.mark.split(" / ")[0]
-                else:
+            for participant in view.assessment.participants:
+                if participant.mark.kind not in (PERCENTAGE, FRACTION):
                     # Probably "Not Assessed"
                     # skip participant if no mark
                     continue
-                # example course name "9 My Subject Name 1C", remove " 1C"
-                course = " ".join(assessment.folder.name.split(" ")[:-1])
                 if participant.comment == "":
                     comment = "NO COMMENT PROVIDED"
                 else:
@@ -340,10 +555,101 @@ def generate_comments_csv(
                 writer.writerow(
                     [
                         participant.external_id,
-                        course,
-                        assessment.title,
+                        view.course,
+                        view.assessment.title,
                         # take mark from "43 / 55" to 43
-                        mark,
+                        participant.mark.raw,
                         comment,
                     ]
                 )
+                rows += 1
+    finally:
+        marks_file.close()
+
+    get_metrics().written(marks_file.name, rows)
+    return rows
+
+
+def export_mode(
+    mode: str,
+    assessments: Iterable["Assessment"],
+    year_group: int,
+    start_date: str,
+    end_date: str,
+    output_dir: str = ".",
+    delta: bool = False,
+) -> int:
+    """Generate every file for a mode of the program.
+
+    Args:
+        mode (str): Mode of the program
+        assessments (Iterable["Assessment"]): Assessments, iterated once
+        year_group (int): Year group to put in the filename
+        start_date (str): Start date to put in the filename
+        end_date (str): End date to put in the filename
+        output_dir (str, optional): Directory to write to. Defaults to ".".
+        delta (bool, optional): Only write rows that are new or changed since the last
+            delta export, for the markbook export. Defaults to False.
+
+    Returns:
+        int: Number of rows written across all files, excluding headers
+    """
+    # derived fields are computed once here and shared by every generator
+    views = map(normalize, assessments)
+    if mode == "All tasks overview":
+        return generate_assessments_simple_csv(
+            views, year_group, start_date, end_date, output_dir
+        )
+    if mode == "Comments export":
+        return generate_comments_csv(
+            views, year_group, start_date, end_date, output_dir
+        )
+    if mode == "Markbook export":
+        return generate_markbook_csv(
+            views, year_group, start_date, end_date, output_dir, delta
+        )
+    return 0
+
+
+def export_year_groups(
+    mode: str,
+    partitions: Dict[int, List["Assessment"]],
+    start_date: str,
+    end_date: str,
+    output_dir: str = ".",
+    delta: bool = False,
+) -> Dict[int, Tuple[float, int]]:
+    """Generate the files for several year groups concurrently.
+
+    Args:
+        mode (str): Mode of the program
+        partitions (Dict[int, List["Assessment"]]): Assessments for each year group
+        start_date (str): Start date to put in the filenames
+        end_date (str): End date to put in the filenames
+        output_dir (str, optional): Directory to write to. Defaults to ".".
+        delta (bool, optional): Only write rows that are new or changed since the last
+            delta export, for the markbook export. Defaults to False.
+
+    Returns:
+        Dict[int, Tuple[float, int]]: Seconds taken and rows written for each year group
+    """
+
+    def export_year(year_group: int) -> Tuple[float, int]:
+        start = time.perf_counter()
+        rows = export_mode(
+            mode,
+            partitions[year_group],
+            year_group,
+            start_date,
+            end_date,
+            output_dir,
+            delta,
+        )
+        return time.perf_counter() - start, rows
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = {
+            year_group: executor.submit(export_year, year_group)
+            for year_group in partitions
+        }
+        return {year_group: future.result() for year_group, future in futures.items()}
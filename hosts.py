@@ -0,0 +1,188 @@
+"""
+Exports for several Schoolbox hosts (e.g. one per campus) at once.
+
+Hosts are listed in a JSON file, each with a name, URL and credentials:
+    [
+        {"name": "north", "host": "https://north.school/api/assessment",
+         "auth_env": "NORTH_AUTH", "rate": 5},
+        {"name": "south", "host": "https://south.school/api/assessment",
+         "auth": "Bearer ..."}
+    ]
+`auth_env` names an environment variable holding the token, so tokens can
+stay in .env. `pool_size`, `timeout`, `retries`, `max_retry_after` and
+`rate` (requests per second, 0 for no limit) are optional and default to the
+HTTP_* variables.
+
+Each host gets its own client, and so its own connection pool and rate
+limit, and is fetched and exported on its own thread into a directory named
+after it. A host that fails or hangs doesn't stop the others.
+"""
+
+import concurrent.futures
+import json
+import os
+import time
+import traceback
+from typing import Dict, List
+
+from client import Client, get_client, set_host_client
+from display import silence
+from export import export_year_groups
+from input import input_and_req
+from process import parse_json
+
+
+class HostConfig:
+    """
+    Where to fetch one host's assessments from and how hard to hit it.
+    """
+
+    def __init__(self, entry: dict):
+        self.name: str = entry["name"]
+        self.host: str = entry["host"]
+        if "auth_env" in entry:
+            self.auth: str | None = os.getenv(entry["auth_env"])
+            if self.auth is None:
+                raise ValueError(
+                    f"{self.name}: {entry['auth_env']} environment variable not set"
+                )
+        else:
+            self.auth = entry["auth"]
+        self.pool_size = int(entry.get("pool_size", os.getenv("HTTP_POOL_SIZE", "10")))
+        self.timeout = float(entry.get("timeout", os.getenv("HTTP_TIMEOUT", "30")))
+        self.retries = int(entry.get("retries", os.getenv("HTTP_RETRIES", "5")))
+        self.rate = float(entry.get("rate", 0))
+        self.max_retry_after = float(
+            entry.get("max_retry_after", os.getenv("HTTP_MAX_RETRY_AFTER", "60"))
+        )
+
+
+def load_hosts(path: str) -> List[HostConfig]:
+    """Read the hosts to export from.
+
+    Args:
+        path (str): JSON file listing the hosts
+
+    Raises:
+        ValueError: The file is empty, or two hosts share a name
+
+    Returns:
+        List[HostConfig]: Each host, in file order
+    """
+    with open(path, "r", encoding="UTF-8") as f:
+        hosts = [HostConfig(entry) for entry in json.load(f)]
+    if not hosts:
+        raise ValueError(f"No hosts listed in {path}")
+    names = [host.name for host in hosts]
+    if len(set(names)) != len(names):
+        raise ValueError("Host names must be unique, they name the output directories")
+    return hosts
+
+
+def export_host(
+    config: HostConfig,
+    start_date: str,
+    end_date: str,
+    mode: str,
+    year_groups: List[int],
+    output_dir: str,
+    refresh: bool = False,
+) -> dict:
+    """Fetch and export every year group for one host.
+
+    Args:
+        config (HostConfig): Host to export
+        start_date (str): First day of the window, YYYY-MM-DD
+        end_date (str): Last day of the window, YYYY-MM-DD
+        mode (str): Mode of the program
+        year_groups (List[int]): Year groups to export
+        output_dir (str): Directory the host's own directory is created in
+        refresh (bool, optional): Ignore cached responses. Defaults to False.
+
+    Returns:
+        dict: Status, seconds taken, requests made and rows written
+    """
+    started = time.perf_counter()
+    directory = os.path.join(output_dir, config.name)
+    summary = {"host": config.name, "status": "ok", "requests": 0, "rows": 0}
+    try:
+        os.makedirs(directory, exist_ok=True)
+        _, start, end, mode, data = input_and_req(
+            start_date=start_date,
+            end_date=end_date,
+            year_group=year_groups,
+            refresh=refresh,
+            mode=mode,
+            archive=os.path.join(directory, "data.ndjson.gz"),
+            host=config.host,
+            auth=config.auth,
+        )
+
+        result = parse_json(data, mode)
+        partitions = result.partition_by_years(year_groups, start, end)
+        written = export_year_groups(mode, partitions, start, end, directory)
+        summary["rows"] = sum(rows for _, rows in written.values())
+    except Exception as error:  # pylint: disable=broad-except
+        summary["status"] = f"failed: {error}"
+        with open(os.path.join(directory, "error.txt"), "w", encoding="UTF-8") as f:
+            traceback.print_exc(file=f)
+    summary["seconds"] = time.perf_counter() - started
+    summary["requests"] = get_client(config.host).stats()["requests"]
+    return summary
+
+
+def export_hosts(
+    hosts: List[HostConfig],
+    start_date: str,
+    end_date: str,
+    mode: str,
+    year_groups: List[int],
+    output_dir: str = ".",
+    refresh: bool = False,
+) -> List[dict]:
+    """Export several hosts concurrently, each into its own directory.
+
+    Args:
+        hosts (List[HostConfig]): Hosts to export
+        start_date (str): First day of the window, YYYY-MM-DD
+        end_date (str): Last day of the window, YYYY-MM-DD
+        mode (str): Mode of the program
+        year_groups (List[int]): Year groups to export
+        output_dir (str, optional): Directory to create each host's directory in.
+            Defaults to ".".
+        refresh (bool, optional): Ignore cached responses. Defaults to False.
+
+    Returns:
+        List[dict]: Summary of each host, in the order given
+    """
+    # Progress bars from several threads would write over each other
+    silence()
+    for config in hosts:
+        set_host_client(
+            config.host,
+            Client(
+                pool_size=config.pool_size,
+                timeout=config.timeout,
+                retries=config.retries,
+                rate=config.rate,
+                max_retry_after=config.max_retry_after,
+            ),
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=len(hosts), thread_name_prefix="host"
+    ) as executor:
+        futures: Dict[str, concurrent.futures.Future] = {
+            config.name: executor.submit(
+                export_host,
+                config,
+                start_date,
+                end_date,
+                mode,
+                year_groups,
+                output_dir,
+                refresh,
+            )
+            for config in hosts
+        }
+        return [futures[config.name].result() for config in hosts]
@@ -5,19 +5,47 @@ Takes input from user and makes request to API.
 import concurrent.futures
 import os
 import time
-from datetime import datetime
-from typing import Dict, Tuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-import inquirer
 import requests
 from dotenv import load_dotenv
-from progress.spinner import Spinner
+
+from archive import ArchiveWriter
+from cache import get_cache
+from client import get_client
+from display import spinner as create_spinner
+from metrics import get_metrics
+from store import get_store
+from stream import prefetch
+
+MODES = ["All tasks overview", "Comments export", "Markbook export"]
+
+# Task fields read by process.parse_task, requested when projection is pushed down
+OVERVIEW_FIELDS = [
+    "id",
+    "title",
+    "assessmentType",
+    "commonAssessment",
+    "workType",
+    "folder",
+    "subjectCode",
+    "project",
+    "weight",
+    "dueDate",
+]
+MODE_FIELDS = {
+    "All tasks overview": OVERVIEW_FIELDS,
+    "Comments export": OVERVIEW_FIELDS + ["participants"],
+    "Markbook export": OVERVIEW_FIELDS + ["participants"],
+}
 
 
 def make_request(
     host: str, params: Dict[str, str | int], headers: Dict[str, str]
 ) -> requests.Response:
-    """Make a request to the API.
+    """Make a request to the API through the shared pooled client.
+    Successful responses are served from and saved to the response cache.
 
     Args:
         host (str): Host URL
@@ -27,38 +55,619 @@ def make_request(
     Returns:
         requests.Response: Response from the API
     """
-    return requests.get(host, params=params, headers=headers)
+    metrics = get_metrics()
+    cache = get_cache()
+    start = time.perf_counter()
+    cached = cache.get(host, params)
+    if cached is not None:
+        size = len(cached.text.encode("UTF-8"))
+        metrics.page(
+            time.perf_counter() - start, size, 0, cached.status_code, cached=True
+        )
+        return cached
 
+    response = get_client(host).get(host, params=params, headers=headers)
+    size = len(response.content)
+    metrics.page(
+        time.perf_counter() - start,
+        size,
+        int(response.headers.get("Content-Length", size)),
+        response.status_code,
+        cached=False,
+    )
+    if response.status_code == 200:
+        cache.put(host, params, response)
+    return response
 
-def input_and_req(
-    start_date=None, end_date=None, year_group=None
-) -> Tuple[int, str, str, str, list[dict], int]:
-    """Takes input from user and makes request to API.
+
+def build_params(
+    start_date: datetime,
+    end_date: datetime,
+    mode: str,
+    year_group: int | None = None,
+    fields: List[str] | None = None,
+) -> Dict[str, str | int]:
+    """Build the query parameters for a due date window.
 
     Args:
-        start_date (str, optional): Start date to search the API. Defaults to None.
-        end_date (str, optional): End date to search the API. Defaults to None.
-        year_group (str, optional): Year group to filter the API results. Defaults to None.
+        start_date (datetime): First day of the window
+        end_date (datetime): Last day of the window
+        mode (str): Mode of the program
+        year_group (int, optional): Year level to filter on the server. The results
+            are still filtered locally. Defaults to None.
+        fields (List[str], optional): Only request these task fields. Defaults to None.
+
+    Returns:
+        Dict[str, str | int]: Parameters for the first page of the request
+    """
+    # convert to format required by API, start midnight and end 11:59pm
+    # I love daylight savings
+    # This is a greedy filter that will match 1 hour before and after the start and end dates if the timezone is incorrect.
+    due_date = f'"dueDate":{{"from": "{start_date.strftime("%Y-%m-%dT00:00:00+11:00")}","to": "{end_date.strftime("%Y-%m-%dT23:59:59+10:00")}"}}'
+    if year_group is not None:
+        due_date += f',"yearLevel":{{"name":"{year_group}"}}'
+    if mode == "All tasks overview":
+        # Don't remove unweighted or non-assessment tasks
+        query = f"{{{due_date}}}"
+    else:
+        query = (
+            f'{{"weighted":true,"workType":{{"name":"Assessment task"}},{due_date}}}'
+        )
+
+    params: Dict[str, str | int] = {
+        "filter": query,
+        "limit": 500,
+    }
+    if fields is not None:
+        params["fields"] = ",".join(fields)
+    return params
+
+
+def conditional_headers(
+    headers: Dict[str, str], page: Dict[str, str | None] | None
+) -> Dict[str, str]:
+    """Add the validators a page was last returned with, so the server can
+    answer 304 Not Modified if it hasn't changed.
+
+    Args:
+        headers (Dict[str, str]): Headers for the request
+        page (Dict[str, str | None] | None): The page's "etag" and
+            "last_modified", or None to ask for it unconditionally
+
+    Returns:
+        Dict[str, str]: Headers for the request
+    """
+    headers = dict(headers)
+    if page is not None:
+        if page.get("etag") is not None:
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified") is not None:
+            headers["If-Modified-Since"] = page["last_modified"]
+    return headers
+
+
+def probe_count(
+    host: str, params: Dict[str, str | int], headers: Dict[str, str]
+) -> int:
+    """Get the number of assessments a query matches, with a one-task request.
+
+    Args:
+        host (str): Host URL
+        params (Dict[str, str | int]): Parameters for the first page of the query
+        headers (Dict[str, str]): Headers for the request
 
     Raises:
-        ValueError: AUTH environment variable not set
-        ValueError: HOST environment variable not set
+        ValueError: The API returned a non-200 status code
 
     Returns:
-        Tuple[int, str, str, dict, int] | None: _description_
+        int: Number of assessments across every page of the query
     """
-    load_dotenv()
+    params = dict(params)
+    params["limit"] = 1
+    params.pop("cursor", None)
+    response = make_request(host, params, headers)
+    if response.status_code != 200:
+        raise ValueError(f"API returned status {response.status_code}: {response.text}")
+    return response.json()["metadata"]["count"]
+
+
+def probe_pushdown(
+    host: str,
+    headers: Dict[str, str],
+    start_date: datetime,
+    end_date: datetime,
+    mode: str,
+    year_group: int | None,
+) -> Tuple[int | None, List[str] | None]:
+    """Check which filters and projections the server accepts, with a one-task
+    request for each. Anything the server rejects is left out and done locally.
+
+    Args:
+        host (str): Host URL
+        headers (Dict[str, str]): Headers for the request
+        start_date (datetime): First day of the window
+        end_date (datetime): Last day of the window
+        mode (str): Mode of the program
+        year_group (int | None): Year group to filter on, None if exporting several
+
+    Returns:
+        Tuple[int | None, List[str] | None]: Year group and fields to push down
+    """
+    metrics = get_metrics()
+    if year_group is not None:
+        params = build_params(start_date, end_date, mode, year_group=year_group)
+        params["limit"] = 1
+        if make_request(host, params, headers).status_code != 200:
+            print("Server rejected the year level filter, filtering locally")
+            metrics.count("pushdown_rejected")
+            year_group = None
+
+    fields = MODE_FIELDS[mode]
+    params = build_params(start_date, end_date, mode, fields=fields)
+    params["limit"] = 1
+    response = make_request(host, params, headers)
+    if response.status_code != 200:
+        print("Server rejected the field projection, requesting every field")
+        metrics.count("pushdown_rejected")
+        fields = None
+    elif any(key not in fields for task in response.json()["data"] for key in task):
+        # Harmless, the extra fields are ignored when parsing
+        metrics.count("pushdown_ignored")
+
+    return year_group, fields
+
+
+def split_date_range(
+    start_date: datetime, end_date: datetime, shards: int | str
+) -> List[Tuple[datetime, datetime]]:
+    """Split a due date window into consecutive, non-overlapping sub-ranges.
+
+    Args:
+        start_date (datetime): First day of the window
+        end_date (datetime): Last day of the window
+        shards (int | str): Number of sub-ranges, or "week" / "month"
+
+    Returns:
+        List[Tuple[datetime, datetime]]: First and last day of each sub-range
+    """
+    ranges = []
+    if shards == "week" or shards == "month":
+        current = start_date
+        while current <= end_date:
+            if shards == "week":
+                following = current + timedelta(days=7)
+            elif current.month == 12:
+                following = current.replace(year=current.year + 1, month=1, day=1)
+            else:
+                following = current.replace(month=current.month + 1, day=1)
+            ranges.append((current, min(following - timedelta(days=1), end_date)))
+            current = following
+        return ranges
+
+    days = (end_date - start_date).days + 1
+    shards = max(1, min(int(shards), days))
+    for i in range(shards):
+        first = start_date + timedelta(days=days * i // shards)
+        last = start_date + timedelta(days=days * (i + 1) // shards - 1)
+        ranges.append((first, last))
+    return ranges
+
+
+def iter_pages(
+    host: str, params: Dict[str, str | int], headers: Dict[str, str]
+) -> Iterator[dict]:
+    """Follow the API cursor lazily, requesting each page only when needed.
+
+    Args:
+        host (str): Host URL
+        params (Dict[str, str | int]): Parameters for the first page
+        headers (Dict[str, str]): Headers for the request
+
+    Raises:
+        ValueError: The API returned a non-200 status code
+
+    Yields:
+        dict: Each page of the response, including its metadata
+    """
+    params = dict(params)
+    while True:
+        req = make_request(host, params, headers)
+        if req.status_code != 200:
+            raise ValueError(f"API returned status {req.status_code}: {req.text}")
+
+        with get_metrics().stage("json_decode"):
+            current = req.json()
+        yield current
+
+        if current["metadata"]["cursor"] is None:
+            break
+        params["cursor"] = current["metadata"]["cursor"]
+
+
+def stream_tasks(
+    host: str,
+    headers: Dict[str, str],
+    ranges: List[Tuple[datetime, datetime]],
+    mode: str,
+    archive: ArchiveWriter | None = None,
+    year_group: int | None = None,
+    fields: List[str] | None = None,
+) -> Iterator[dict]:
+    """Yield assessments page by page, downloading the next page in the background.
+
+    Args:
+        host (str): Host URL
+        headers (Dict[str, str]): Headers for the request
+        ranges (List[Tuple[datetime, datetime]]): Due date sub-ranges, fetched in order
+        mode (str): Mode of the program
+        archive (ArchiveWriter, optional): Archive to append each page to, closed once
+            every page has been read. Defaults to None.
+        year_group (int, optional): Year level to filter on the server. Defaults to None.
+        fields (List[str], optional): Only request these task fields. Defaults to None.
 
-    auth: str | None = os.getenv("AUTH")
+    Yields:
+        dict: Each assessment returned by the API, de-duplicated by id
+    """
+    seen = set()
+    try:
+        for index, (first, last) in enumerate(ranges):
+            fetched = 0
+            count = 0
+            for page in prefetch(
+                iter_pages(
+                    host,
+                    build_params(first, last, mode, year_group, fields),
+                    headers,
+                )
+            ):
+                if archive is not None:
+                    archive.write(index, page)
+                fetched += len(page["data"])
+                count = page["metadata"]["count"]
+                for task in page["data"]:
+                    if task["id"] in seen:
+                        continue
+                    seen.add(task["id"])
+                    yield task
+
+            assert fetched == count
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def fetch_window(
+    host: str,
+    headers: Dict[str, str],
+    ranges: List[Tuple[datetime, datetime]],
+    mode: str,
+    workers: int,
+    archive: ArchiveWriter | None = None,
+    year_group: int | None = None,
+    fields: List[str] | None = None,
+) -> list[dict]:
+    """Fetch every assessment in a due date window, showing a spinner while waiting.
+
+    Each sub-range is its own cursor chain, and all of them run concurrently
+    on the fetch engine with at most `workers` requests in flight, or a number
+    adapted to the server's pushback if FETCH_ADAPTIVE=1.
+
+    Args:
+        host (str): Host URL
+        headers (Dict[str, str]): Headers for the request
+        ranges (List[Tuple[datetime, datetime]]): Sub-ranges covering the window
+        mode (str): Mode of the program
+        workers (int): Maximum number of requests in flight at once
+        archive (ArchiveWriter, optional): Archive to append each page to as it
+            arrives. Defaults to None.
+        year_group (int, optional): Year level to filter on the server. Defaults to None.
+        fields (List[str], optional): Only request these task fields. Defaults to None.
+
+    Raises:
+        ValueError: The API returned a non-200 status code
+
+    Returns:
+        list[dict]: De-duplicated assessments
+    """
+    # engine imports make_request from this module
+    # pylint: disable=import-outside-toplevel
+    from adaptive import controller_from_env
+    from engine import fetch_queries
+
+    spinner = create_spinner("Requesting data from API... ")
+    shards = fetch_queries(
+        host,
+        headers,
+        [build_params(first, last, mode, year_group, fields) for first, last in ranges],
+        workers,
+        spinner,
+        archive.write if archive is not None else None,
+        controller_from_env(get_client(host), workers),
+    )
+    spinner.finish()
+
+    # The greedy timezone filter overlaps neighbouring shards, so the same
+    # assessment can come back twice. Keep the first copy in shard order.
+    data = []
+    seen = set()
+    for shard in shards:
+        for task in shard:
+            if task["id"] in seen:
+                continue
+            seen.add(task["id"])
+            data.append(task)
+
+    return data
+
+
+def fetch_shard(
+    host: str,
+    params: Dict[str, str | int],
+    headers: Dict[str, str],
+    stored: List[dict] | None = None,
+) -> Tuple[list[dict], List[dict], int] | None:
+    """Follow one shard's cursor, sending each page's validators from last time.
+
+    Args:
+        host (str): Host URL
+        params (Dict[str, str | int]): Parameters for the first page
+        headers (Dict[str, str]): Headers for the request
+        stored (List[dict], optional): Params, validators and next cursor of each
+            page when the shard was last fetched. Defaults to None, which fetches
+            every page.
+
+    Raises:
+        ValueError: The API returned a non-200 status code
+
+    Returns:
+        Tuple[list[dict], List[dict], int] | None: The shard's assessments, its
+            pages and count, or None if the server says no page has changed
+    """
+    first_params = params
+    params = dict(params)
+    tasks: List[dict] = []
+    pages: List[dict] = []
+    not_modified = 0
+    count = 0
+    while True:
+        page = None
+        if stored is not None and len(pages) < len(stored):
+            page = stored[len(pages)]
+            if page["params"] != params:
+                page = None
+        response = make_request(host, params, conditional_headers(headers, page))
+        if response.status_code == 304 and page is not None:
+            not_modified += 1
+            pages.append(page)
+            cursor = page["cursor"]
+        elif response.status_code == 200:
+            if not_modified:
+                # The unchanged pages before this one weren't sent again
+                return fetch_shard(host, first_params, headers)
+            # Pages after a changed one are fetched whole, as they may have moved
+            stored = None
+            with get_metrics().stage("json_decode"):
+                current = response.json()
+            tasks.extend(current["data"])
+            count = current["metadata"]["count"]
+            cursor = current["metadata"]["cursor"]
+            pages.append(
+                {
+                    "params": dict(params),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "cursor": cursor,
+                }
+            )
+        else:
+            raise ValueError(
+                f"API returned status {response.status_code}: {response.text}"
+            )
+
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+
+    if not_modified == len(pages):
+        return None
+    assert len(tasks) == count
+    return tasks, pages, count
+
+
+def sync_window(
+    host: str,
+    headers: Dict[str, str],
+    start_date: datetime,
+    end_date: datetime,
+    mode: str,
+    workers: int,
+    refresh: bool,
+    year_group: int | None = None,
+    fields: List[str] | None = None,
+) -> list[dict]:
+    """Bring the local store up to date for a window and return its assessments.
+
+    The window is split into months, and the first sync fetches all of them.
+    Later syncs ask the server which months have changed and only fetch those:
+    - If the server sent ETag / Last-Modified, every page of the month is
+      requested with them, so an unchanged month costs an empty 304 per page.
+    - Otherwise a one-task request compares the number of assessments, and
+      months due from SYNC_LOOKBACK_DAYS (default 14) before the previous sync
+      onwards are always fetched, as their tasks are still being marked. As
+      that can't see marks edited on older tasks, a month is also fetched
+      again once it is SYNC_FULL_EVERY_DAYS (default 28) days old.
+
+    Args:
+        host (str): Host URL
+        headers (Dict[str, str]): Headers for the request
+        start_date (datetime): First day of the window
+        end_date (datetime): Last day of the window
+        mode (str): Mode of the program
+        workers (int): Maximum number of months checked or fetched at once
+        refresh (bool): Fetch the whole window even if it was synced before
+        year_group (int, optional): Year level to filter on the server, which is then
+            stored as a window of its own. Defaults to None.
+        fields (List[str], optional): Only request these task fields. Defaults to None.
+
+    Raises:
+        ValueError: The API returned a non-200 status code
+
+    Returns:
+        list[dict]: Every stored assessment for the window
+    """
+    store = get_store()
+    kind = "overview" if mode == "All tasks overview" else "assessment"
+    window = f'{kind}:{start_date.strftime("%Y-%m-%d")}:{end_date.strftime("%Y-%m-%d")}'
+    if year_group is not None:
+        window += f":{year_group}"
+
+    # Every sync has to reach the server
+    get_cache().refresh = True
+    synced_at = datetime.now()
+    known = {} if refresh else store.shards(window)
+    watermark = None if refresh else store.watermark(window)
+    full_every = timedelta(days=float(os.getenv("SYNC_FULL_EVERY_DAYS", "28")))
+    recent = None
+    if watermark is not None:
+        lookback = timedelta(days=int(os.getenv("SYNC_LOOKBACK_DAYS", "14")))
+        recent = datetime(watermark.year, watermark.month, watermark.day) - lookback
+
+    def sync_shard(first: datetime, last: datetime):
+        params = build_params(first, last, mode, year_group, fields)
+        stored = known.get(f"{first:%Y-%m-%d}:{last:%Y-%m-%d}")
+        if stored is None:
+            return fetch_shard(host, params, headers)
+        fetched_at, count, pages = stored
+        if any(page["etag"] or page["last_modified"] for page in pages):
+            return fetch_shard(host, params, headers, pages)
+        if (
+            synced_at - fetched_at < full_every
+            and recent is not None
+            and last < recent
+            and probe_count(host, params, headers) == count
+        ):
+            return None
+        return fetch_shard(host, params, headers)
+
+    ranges = split_date_range(start_date, end_date, "month")
+    spinner = create_spinner("Checking for changes... ")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = []
+        for result in executor.map(lambda r: sync_shard(*r), ranges):
+            results.append(result)
+            spinner.next()
+    spinner.finish()
+
+    # The greedy timezone filter overlaps neighbouring months, so the same
+    # assessment can come back twice. Keep the first copy in month order.
+    data = []
+    seen = set()
+    slices = []
+    shards = {}
+    for (first, last), result in zip(ranges, results):
+        if result is None:
+            continue
+        tasks, pages, count = result
+        slices.append((first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d")))
+        shards[f"{first:%Y-%m-%d}:{last:%Y-%m-%d}"] = (count, pages)
+        for task in tasks:
+            if task["id"] not in seen:
+                seen.add(task["id"])
+                data.append(task)
+    print(f"{len(slices)} of {len(ranges)} months changed since the last sync")
+    get_metrics().count("sync_months_fetched", len(slices))
+
+    store.update(
+        window,
+        data,
+        synced_at,
+        None if len(slices) == len(ranges) else slices,
+        shards,
+    )
+    return store.tasks(window)
+
+
+def api_headers(auth: str | None = None) -> Dict[str, str]:
+    """Build the headers for API requests.
+
+    Args:
+        auth (str, optional): Authorization header. Defaults to the AUTH
+            environment variable.
+
+    Raises:
+        ValueError: AUTH environment variable not set
+
+    Returns:
+        Dict[str, str]: Headers for every request
+    """
+    if auth is None:
+        auth = os.getenv("AUTH")
     if auth is None:
         raise ValueError("AUTH environment variable not set")
 
-    headers: Dict[str, str] = {
+    return {
         "Authorization": auth,
         "Accept": "application/json",
         "Content-Type": "application/json",
     }
 
+
+def input_and_req(
+    start_date=None,
+    end_date=None,
+    year_group=None,
+    shards=None,
+    workers=None,
+    stream=False,
+    refresh=False,
+    sync=False,
+    all_years=False,
+    mode=None,
+    archive=None,
+    host=None,
+    auth=None,
+) -> Tuple[int | List[int], str, str, str, Iterable[dict]]:
+    """Takes input from user and makes request to API.
+
+    Args:
+        start_date (str, optional): Start date to search the API. Defaults to None.
+        end_date (str, optional): End date to search the API. Defaults to None.
+        year_group (str | List[str], optional): Year group to filter the API results,
+            or a list of year groups. Defaults to None.
+        shards (int | str, optional): Number of due date sub-ranges to fetch concurrently,
+            or "week" / "month". Defaults to the FETCH_SHARDS environment variable, or 1.
+        workers (int, optional): Maximum number of requests in flight at once.
+            Defaults to the FETCH_WORKERS environment variable, or 4.
+        stream (bool, optional): Return a lazy iterator over the assessments instead of
+            fetching everything up front. Defaults to False.
+        refresh (bool, optional): Ignore cached responses and sync watermarks, and download
+            everything again. Defaults to False.
+        sync (bool, optional): Only fetch the months that changed since the last sync,
+            which are always split by month, and read the rest of the window from
+            the local store. Defaults to False.
+        all_years (bool, optional): Don't ask for a year group, and return every year
+            group from 7 to 13 as a list instead. Defaults to False.
+        mode (str, optional): Mode of the program, one of MODES. Defaults to None.
+        archive (str, optional): File to write a compressed archive of every page to,
+            as it is fetched. Defaults to None.
+        host (str, optional): Host URL. Defaults to the HOST environment variable.
+        auth (str, optional): Authorization header. Defaults to the AUTH environment
+            variable.
+
+    Raises:
+        ValueError: AUTH environment variable not set
+        ValueError: HOST environment variable not set
+        ValueError: The API returned a non-200 status code
+
+    Returns:
+        Tuple[int | List[int], str, str, str, Iterable[dict]]: Year group(s), start
+            and end dates, mode and assessments
+    """
+    load_dotenv()
+    get_cache().refresh = refresh
+
+    headers = api_headers(auth)
+
     if start_date is None or end_date is None:
         # request and validate input from user in form YYYY-MM-DD for start and end time
         valid = False
@@ -80,7 +689,9 @@ def input_and_req(
         if start_date >= end_date:
             raise ValueError("Start date must be before end date")
 
-    if year_group is None:
+    if all_years:
+        year_group = list(range(7, 14))
+    elif year_group is None:
         # input year group between 7 and 13
         valid = False
         while not valid:
@@ -93,64 +704,99 @@ def input_and_req(
                     print("Year group must be between 7 and 13")
             except ValueError:
                 print("Invalid year group")
+    elif isinstance(year_group, list):
+        year_group = [int(year) for year in year_group]
+        if not all(7 <= year <= 13 for year in year_group):
+            raise ValueError("Year group must be between 7 and 13")
     else:
         year_group = int(year_group)
         if not 7 <= year_group <= 13:
             raise ValueError("Year group must be between 7 and 13")
 
-    options = ["All tasks overview", "Comments export", "Markbook export"]
-    questions = [
-        inquirer.List(
-            "option",
-            message="Select an option",
-            choices=options,
-        ),
-    ]
-    answers = inquirer.prompt(questions)
-    mode = answers["option"]
-
-    # ,"yearLevel":{{"name": "{year_group}"}}
-    # convert to format required by API, start midnight and end 11:59pm
-    params: Dict[
-        str,
-        str | int,
-    ] = {
-        # I love daylight savings
-        # This is a greedy filter that will match 1 hour before and after the start and end dates if the timezone is incorrect.
-        "filter": f'{{"weighted":true,"workType":{{"name":"Assessment task"}},"dueDate":{{"from": "{start_date.strftime("%Y-%m-%dT00:00:00+11:00")}","to": "{end_date.strftime("%Y-%m-%dT23:59:59+10:00")}"}}}}',
-        "limit": 500,
-    }
-    if mode == "All tasks overview":
-        # Don't remove unweighted or non-assessment tasks
-        params["filter"] = (
-            f'{{"dueDate":{{"from": "{start_date.strftime("%Y-%m-%dT00:00:00+11:00")}","to": "{end_date.strftime("%Y-%m-%dT23:59:59+10:00")}"}}}}'
-        )
+    if mode is None:
+        # inquirer is slow to import, so only load it when we need to ask
+        import inquirer  # pylint: disable=import-outside-toplevel
 
-    host: str | None = os.getenv("HOST")
+        questions = [
+            inquirer.List(
+                "option",
+                message="Select an option",
+                choices=MODES,
+            ),
+        ]
+        answers = inquirer.prompt(questions)
+        mode = answers["option"]
+    elif mode not in MODES:
+        raise ValueError("Mode must be one of: " + ", ".join(MODES))
+
+    if host is None:
+        host = os.getenv("HOST")
     if host is None:
         raise ValueError("HOST environment variable not set")
 
-    spinner = Spinner("Requesting data from API... ")
-    data = []
-    while True:
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(make_request, host, params, headers)
+    if shards is None:
+        shards = os.getenv("FETCH_SHARDS", "1")
+    if workers is None:
+        workers = int(os.getenv("FETCH_WORKERS", "4"))
 
-            while not future.done():
-                spinner.next()
-                time.sleep(0.1)
+    ranges = split_date_range(start_date, end_date, shards)
 
-            req = future.result()
+    # Opt in, as the server's year level can disagree with the folder codes
+    # that results are filtered on locally
+    pushed_year, fields = None, None
+    if os.getenv("API_PUSHDOWN", "0") == "1":
+        pushed_year, fields = probe_pushdown(
+            host,
+            headers,
+            start_date,
+            end_date,
+            mode,
+            None if isinstance(year_group, list) else year_group,
+        )
 
-        current = req.json()
-        params["cursor"] = current["metadata"]["cursor"]
-        data.extend(current["data"])
+    writer = None
+    if archive is not None:
+        writer = ArchiveWriter(
+            archive,
+            mode,
+            start_date.strftime("%Y-%m-%d"),
+            end_date.strftime("%Y-%m-%d"),
+            pushed_year,
+        )
 
-        if current["metadata"]["cursor"] is None:
-            break
-    spinner.finish()
+    if stream:
+        return (
+            year_group,
+            start_date.strftime("%Y-%m-%d"),
+            end_date.strftime("%Y-%m-%d"),
+            mode,
+            stream_tasks(host, headers, ranges, mode, writer, pushed_year, fields),
+        )
 
-    assert len(data) == current["metadata"]["count"]
+    try:
+        with get_metrics().stage("fetch"):
+            if sync:
+                data = sync_window(
+                    host,
+                    headers,
+                    start_date,
+                    end_date,
+                    mode,
+                    workers,
+                    refresh,
+                    pushed_year,
+                    fields,
+                )
+                # Only recent changes were fetched, so archive the whole window
+                if writer is not None:
+                    writer.write_tasks(data)
+            else:
+                data = fetch_window(
+                    host, headers, ranges, mode, workers, writer, pushed_year, fields
+                )
+    finally:
+        if writer is not None:
+            writer.close()
 
     return (
         year_group,
@@ -158,5 +804,4 @@ def input_and_req(
         end_date.strftime("%Y-%m-%d"),
         mode,
         data,
-        req.status_code,
     )
@@ -0,0 +1,78 @@
+"""
+Ledger of rows already exported to Edumate, so a delta export only writes
+rows that are new or have changed, and lists the rows that have gone.
+"""
+
+import hashlib
+from typing import List, Tuple
+
+from store import get_store
+
+# Separates the fields of a row key, which can't appear in the exported text
+KEY_SEPARATOR = "\x1f"
+
+
+class Ledger:
+    """
+    Content hashes of the rows exported in one scope (year group and kind of
+    row), loaded into memory so each lookup is a single dictionary access.
+    Changes are only saved by commit(), once the export has been written.
+    """
+
+    def __init__(self, scope: str, start_date: str, end_date: str):
+        # scope is e.g. "9:marks", and rows last exported with a due date from
+        # start_date to end_date are removed if this run doesn't export them
+        self.scope = scope
+        self.start_date = start_date
+        self.end_date = end_date
+        self.hashes = get_store().ledger(scope)
+        self.seen = set()
+        self.exported: List[Tuple[str, bytes, str]] = []
+        self.unchanged = 0
+
+    def changed(self, key: tuple, row: tuple, due_date: str) -> bool:
+        """Check whether a row is new or differs from when it was last exported.
+
+        Args:
+            key (tuple): Fields identifying the row
+            row (tuple): Every exported field of the row
+            due_date (str): Due date of the row, YYYY-MM-DD
+
+        Returns:
+            bool: Whether the row should be written
+        """
+        text_key = KEY_SEPARATOR.join(str(field) for field in key)
+        self.seen.add(text_key)
+        row_hash = hashlib.blake2b(
+            KEY_SEPARATOR.join(str(field) for field in row).encode("UTF-8"),
+            digest_size=8,
+        ).digest()
+        previous = self.hashes.get(text_key)
+        if previous is not None and previous[0] == row_hash:
+            self.unchanged += 1
+            return False
+        self.exported.append((text_key, row_hash, due_date))
+        return True
+
+    def removed(self) -> List[tuple]:
+        """Get the rows exported before, due in this run's window, that were not
+        seen again.
+
+        Returns:
+            List[tuple]: Key fields of each removed row, in due date order
+        """
+        removed = [
+            (due_date, key)
+            for key, (_, due_date) in self.hashes.items()
+            if self.start_date <= due_date <= self.end_date and key not in self.seen
+        ]
+        removed.sort()
+        return [tuple(key.split(KEY_SEPARATOR)) for _, key in removed]
+
+    def commit(self) -> None:
+        """Save the rows written in this run and forget the removed ones."""
+        get_store().update_ledger(
+            self.scope,
+            self.exported,
+            (KEY_SEPARATOR.join(key) for key in self.removed()),
+        )
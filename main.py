@@ -1,65 +1,319 @@
 """
 Entry point for the program.
-1. Takes input from user and makes request to API.
+1. Takes input from user (or the command line) and makes request to API.
 2. Parses JSON data from the API into a Result object.
 3. Generates CSV files for tasks and marks.
 """
 
-import concurrent.futures
-import json
+import argparse
+import os
 import sys
-import time
 
-from progress.spinner import Spinner
+from dotenv import load_dotenv
 
-from export import (
-    generate_assessments_csv,
-    generate_assessments_simple_csv,
-    generate_comments_csv,
-    generate_marks_csv,
-)
+from archive import iter_tasks, read_header
+from cache import get_cache
+from client import get_client
+from export import export_mode, export_year_groups
+from hosts import export_hosts, load_hosts
 from input import input_and_req
+from metrics import Profiler, get_metrics
 from model import Result
-from process import parse_json
+from process import parse_json, parse_stream
+from watch import watch_from_env
+
+# --mode values for headless runs
+MODE_NAMES = {
+    "overview": "All tasks overview",
+    "comments": "Comments export",
+    "markbook": "Markbook export",
+}
+
+
+parser = argparse.ArgumentParser(
+    description=__doc__,
+    epilog="Pass --start, --end, --year and --mode to run without any prompts.",
+)
+parser.add_argument("--start", help="start date, YYYY-MM-DD")
+parser.add_argument("--end", help="end date, YYYY-MM-DD")
+parser.add_argument(
+    "--year",
+    type=int,
+    action="append",
+    help="year group from 7 to 13, can be repeated to export several from one fetch",
+)
+parser.add_argument(
+    "--mode",
+    choices=MODE_NAMES,
+    action="append",
+    help="export to generate, can be repeated with --watch",
+)
+parser.add_argument(
+    "--output-dir", default=".", help="directory to write files to (default: .)"
+)
+fetch_mode = parser.add_mutually_exclusive_group()
+fetch_mode.add_argument(
+    "--stream",
+    action="store_true",
+    help="parse and export each page as it arrives instead of loading everything first",
+)
+fetch_mode.add_argument(
+    "--sync",
+    action="store_true",
+    help="only fetch the months that changed since the last sync and export from the "
+    "local assessment store; without ETags from the server, marks edited on older "
+    "tasks are only seen every SYNC_FULL_EVERY_DAYS",
+)
+fetch_mode.add_argument(
+    "--replay",
+    metavar="ARCHIVE",
+    help="export from an archive written by an earlier run instead of the API",
+)
+parser.add_argument(
+    "--archive",
+    help="file to archive the raw API pages to while fetching "
+    "(default: data.ndjson.gz in the output directory)",
+)
+parser.add_argument(
+    "--refresh",
+    action="store_true",
+    help="ignore cached API responses and sync watermarks, and download everything again",
+)
+parser.add_argument(
+    "--delta",
+    action="store_true",
+    help="markbook export only: write just the marks and tasks that are new or "
+    "changed since the last --delta run, and list the removed ones, in files "
+    "named after the run",
+)
+parser.add_argument(
+    "--all-years",
+    action="store_true",
+    help="export every year group from 7 to 13 from a single fetch",
+)
+parser.add_argument(
+    "--watch",
+    type=float,
+    metavar="SECONDS",
+    help="keep running, polling the API every SECONDS and regenerating only the "
+    "year groups whose assessments changed",
+)
+parser.add_argument(
+    "--hosts",
+    metavar="FILE",
+    help="JSON file listing several hosts to export from at once, each into its "
+    "own directory (see hosts.py)",
+)
+parser.add_argument(
+    "--metrics",
+    help="file to write per-stage timings and counts to "
+    "(default: metrics.json in the output directory)",
+)
+parser.add_argument(
+    "--profile",
+    metavar="FILE",
+    help="dump a cProfile of the whole run, across every thread, to FILE",
+)
+
+
+def main():
+    """Run the program with the command line arguments."""
+    args = parser.parse_args()
+    if args.stream and (args.all_years or (args.year and len(args.year) > 1)):
+        parser.error("--stream can only export one year group")
+    if (args.start is None) != (args.end is None):
+        parser.error("--start and --end must be used together")
+    if args.replay and (args.start or args.mode):
+        parser.error("--replay takes the dates and mode from the archive")
+    if args.replay and not (args.year or args.all_years):
+        parser.error("--replay needs --year or --all-years")
+    if (
+        args.delta
+        and not args.replay
+        and (args.mode != ["markbook"] or args.watch is not None)
+    ):
+        parser.error("--delta only works with --mode markbook, and not with --watch")
+    if args.mode and len(args.mode) > 1 and args.watch is None:
+        parser.error("only --watch can take more than one --mode")
+    if args.watch is not None and (
+        args.start is None
+        or args.mode is None
+        or not (args.year or args.all_years)
+        or args.stream
+        or args.sync
+        or args.replay
+    ):
+        parser.error(
+            "--watch needs --start, --end, --mode and --year or --all-years, "
+            "and can't be used with --stream, --sync or --replay"
+        )
+    if args.hosts and (
+        args.start is None
+        or args.mode is None
+        or not (args.year or args.all_years)
+        or args.stream
+        or args.sync
+        or args.replay
+        or args.watch is not None
+        or args.delta
+    ):
+        # The local store and delta ledger aren't separated by host
+        parser.error(
+            "--hosts needs --start, --end, --mode and --year or --all-years, and "
+            "can't be used with --stream, --sync, --replay, --watch or --delta"
+        )
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler()
+        profiler.start()
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            profiler.stop(args.profile)
+            print("Wrote profile to " + args.profile)
+
+
+def run(args: argparse.Namespace) -> None:
+    """Fetch, parse and export as the command line arguments ask."""
+    if args.hosts:
+        load_dotenv()
+        results = export_hosts(
+            load_hosts(args.hosts),
+            args.start,
+            args.end,
+            MODE_NAMES[args.mode[0]],
+            list(range(7, 14)) if args.all_years else sorted(set(args.year)),
+            args.output_dir,
+            args.refresh,
+        )
+        print("Host                Seconds  Requests      Rows  Status")
+        for host in results:
+            print(
+                f"{host['host']:<18}  {host['seconds']:7.2f}  {host['requests']:8}  "
+                f"{host['rows']:8}  {host['status']}"
+            )
+        get_metrics().write(
+            args.metrics or os.path.join(args.output_dir, "metrics.json")
+        )
+        if any(host["status"] != "ok" for host in results):
+            sys.exit(1)
+        return
+
+    if args.watch is not None:
+        watch_from_env(
+            args.start,
+            args.end,
+            [MODE_NAMES[mode] for mode in dict.fromkeys(args.mode)],
+            list(range(7, 14)) if args.all_years else sorted(set(args.year)),
+            args.watch,
+            args.output_dir,
+        )
+        return
 
+    metrics = get_metrics()
 
-def save(data):
-    # save data to file
-    with open("data.json", "w", encoding="UTF-8") as f:
-        json.dump(data, f, indent=4)
+    if args.replay:
+        load_dotenv()
+        header = read_header(args.replay)
+        year_group = list(range(7, 14)) if args.all_years else args.year
+        if len(year_group) == 1:
+            year_group = year_group[0]
+        if header.get("year_group") not in (None, year_group):
+            parser.error(f"{args.replay} only has year {header['year_group']}")
+        if args.delta and header["mode"] != MODE_NAMES["markbook"]:
+            parser.error("--delta only works with a markbook archive")
+        start_date, end_date, mode = header["start"], header["end"], header["mode"]
+        data = iter_tasks(args.replay)
+    else:
+        year_group, start_date, end_date, mode, data = input_and_req(
+            start_date=args.start,
+            end_date=args.end,
+            year_group=args.year[0] if args.year and len(args.year) == 1 else args.year,
+            stream=args.stream,
+            refresh=args.refresh,
+            sync=args.sync,
+            all_years=args.all_years,
+            mode=MODE_NAMES[args.mode[0]] if args.mode else None,
+            archive=args.archive or os.path.join(args.output_dir, "data.ndjson.gz"),
+        )
+    batch = isinstance(year_group, list)
+    # --stream only allows one year group
+    lazy = (args.stream or args.replay) and not batch
 
+    if lazy:
+        # Each page is parsed and filtered as soon as it arrives (or is read
+        # back from the archive), so only a few pages are held in memory at once.
+        def filtered(assessments):
+            for a in assessments:
+                if a.in_year_and_date(year_group, start_date, end_date):
+                    metrics.count("assessments_filtered")
+                    yield a
 
-year_group, start_date, end_date, mode, data, status = input_and_req()
+        assessments = filtered(parse_stream(data, mode))
+    else:
+        with metrics.stage("parse"):
+            result: Result = parse_json(data, mode)
 
-spinner = Spinner("Saving raw API data to file... ")
-with concurrent.futures.ThreadPoolExecutor() as executor:
-    future = executor.submit(save, data)
-    while not future.done():
-        spinner.next()
-        time.sleep(0.1)
-spinner.finish()
+        # Print result (destructure the object)
+        # print(json.dumps(result.__dict__, default=lambda o: o.__dict__, indent=4))
 
-if status != 200:
-    print("Error: " + str(status))
-    print("Check data.json for the full error message")
-    sys.exit(1)
+        # The API returns tasks for all year groups, so we need to filter them
+        # Daylight savings means we might match 1 or 2 results outside of the date range
+        with metrics.stage("filter"):
+            if batch:
+                partitions = result.partition_by_years(year_group, start_date, end_date)
+                metrics.count(
+                    "assessments_filtered", sum(len(p) for p in partitions.values())
+                )
+            else:
+                assessments = result.filter_by_year_and_date(
+                    year_group, start_date, end_date
+                )
+                metrics.count("assessments_filtered", len(assessments))
 
-result: Result = parse_json(data, mode)
+    # When streaming or replaying, fetching, parsing and filtering all happen during export
+    with metrics.stage("stream" if lazy else "export"):
+        if batch:
+            summary = export_year_groups(
+                mode, partitions, start_date, end_date, args.output_dir, args.delta
+            )
+            print("Year  Seconds      Rows")
+            for year, (seconds, rows) in summary.items():
+                print(f"{year:>4}  {seconds:7.2f}  {rows:8}")
+        else:
+            export_mode(
+                mode,
+                assessments,
+                year_group,
+                start_date,
+                end_date,
+                args.output_dir,
+                args.delta,
+            )
+            print(
+                "Generated marks.txt, tasks.txt and comments.csv for year "
+                + str(year_group)
+            )
 
+    stats = get_client().stats()
+    transferred = metrics.summary()["wire_bytes"] / 1024 / 1024
+    print(
+        f"{stats['requests']} requests, {stats['connections_reused']} reused connections, "
+        f"{stats['retries']} retries ({stats['throttled']} throttled), "
+        f"{transferred:.1f} MiB transferred"
+    )
 
-# Print result (destructure the object)
-# print(json.dumps(result.__dict__, default=lambda o: o.__dict__, indent=4))
+    cache = get_cache()
+    if cache.enabled:
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses")
 
-# The API returns tasks for all year groups, so we need to filter them
-# Daylight savings means we might match 1 or 2 results outside of the date range
-assessments = result.filter_by_year_and_date(year_group, start_date, end_date)
+    metrics_path = args.metrics or os.path.join(args.output_dir, "metrics.json")
+    metrics.write(metrics_path)
+    print("Wrote run metrics to " + metrics_path)
 
-if mode == "All tasks overview":
-    generate_assessments_simple_csv(assessments, year_group, start_date, end_date)
-elif mode == "Comments export":
-    generate_comments_csv(assessments, year_group, start_date, end_date)
-elif mode == "Markbook export":
-    generate_assessments_csv(assessments, year_group, start_date, end_date)
-    generate_marks_csv(assessments, year_group, start_date, end_date)
 
-print("Generated marks.txt, tasks.txt and comments.csv for year " + str(year_group))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Records where the time goes in a run: per-stage wall time, per-page latency
+and size, item counts and rows written per output file. Profiler adds a
+cProfile of every thread for --profile.
+"""
+
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+
+class Metrics:
+    """
+    Collects timings and counters from every stage of a run.
+    Safe to update from several threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # stage name -> seconds, added up if a stage runs more than once
+        self.stages: Dict[str, float] = {}
+        self.pages: List[Dict[str, float | int | bool]] = []
+        self.counters: Dict[str, int] = {}
+        self.rows: Dict[str, int] = {}
+        # Concurrency and page size decisions of the adaptive fetch controller
+        self.decisions: List[Dict[str, object]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block of code and add it to a stage.
+
+        Args:
+            name (str): Name of the stage, e.g. "fetch" or "parse"
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def page(
+        self, latency: float, size: int, wire_size: int, status: int, cached: bool
+    ) -> None:
+        """Record a page fetched from the API or the cache.
+
+        Args:
+            latency (float): Seconds until the response was received
+            size (int): Bytes in the decoded response body
+            wire_size (int): Bytes transferred, before decompression
+            status (int): HTTP status code
+            cached (bool): Whether the page came from the response cache
+        """
+        with self.lock:
+            self.pages.append(
+                {
+                    "latency": latency,
+                    "bytes": size,
+                    "wire_bytes": wire_size,
+                    "status": status,
+                    "cached": cached,
+                }
+            )
+
+    def decision(self, entry: Dict[str, object]) -> None:
+        with self.lock:
+            self.decisions.append(entry)
+
+    def written(self, filename: str, rows: int) -> None:
+        with self.lock:
+            self.rows[filename] = self.rows.get(filename, 0) + rows
+
+    def summary(self) -> dict:
+        with self.lock:
+            latencies = sorted(p["latency"] for p in self.pages if not p["cached"])
+            return {
+                "started": self.started,
+                "total_seconds": time.time() - self.started,
+                "stages": dict(self.stages),
+                "pages_fetched": len(self.pages),
+                "pages_cached": sum(1 for p in self.pages if p["cached"]),
+                "bytes": sum(p["bytes"] for p in self.pages),
+                "wire_bytes": sum(p["wire_bytes"] for p in self.pages),
+                "page_latency": {
+                    "min": latencies[0] if latencies else None,
+                    "median": latencies[len(latencies) // 2] if latencies else None,
+                    "max": latencies[-1] if latencies else None,
+                },
+                "counters": dict(self.counters),
+                "rows_written": dict(self.rows),
+                "pages": list(self.pages),
+                "adaptive": list(self.decisions),
+            }
+
+    def write(self, path: str) -> None:
+        """Write the metrics to a JSON file.
+
+        Args:
+            path (str): File to write
+        """
+        with open(path, "w", encoding="UTF-8") as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Get the metrics shared by the whole run.
+
+    Returns:
+        Metrics: The shared metrics
+    """
+    return _metrics
+
+
+def reset_metrics() -> None:
+    """Replace the shared metrics with an empty set, e.g. between the polls
+    of a long-running watch."""
+    global _metrics
+    _metrics = Metrics()
+
+
+class Profiler:
+    """
+    cProfile of every thread in the run, not just the main one: the fetch
+    engine, the export and output writer pools and each host's thread.
+    Each thread has its own profile, and they are merged when stopped.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiles: List[cProfile.Profile] = []
+
+    def add(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+        return profile
+
+    def start_thread(self, *_) -> None:
+        # Called for the first event in each new thread, and replaced there by
+        # that thread's own profile
+        self.add()
+
+    def start(self) -> None:
+        """Profile this thread and every thread started from now on."""
+        # From 3.12 cProfile uses sys.monitoring, which sees every thread at once
+        if sys.version_info < (3, 12):
+            threading.setprofile(self.start_thread)
+        self.add()
+
+    def stop(self, path: str) -> None:
+        """Stop profiling and write the merged stats.
+
+        Args:
+            path (str): File to write, readable with pstats
+        """
+        threading.setprofile(None)
+        with self.lock:
+            profiles = list(self.profiles)
+        for profile in profiles:
+            # Only stops this thread's profile, the others are read as they are
+            profile.disable()
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
@@ -2,14 +2,38 @@
 Model classes to represent data from the API.
 """
 
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, Iterable, List, Set, Tuple
 
+# Kinds of mark a participant can have
+PERCENTAGE = "percentage"  # "86.42 %"
+FRACTION = "fraction"  # "43 / 55"
+NOT_ASSESSED = "not_assessed"  # "Not Assessed"
+UNKNOWN = "unknown"  # anything else
 
-@dataclass
-class Participant:
+
+@dataclass(frozen=True, slots=True)
+class Mark:
     """
-    Represents a student in an assessment.
+    A participant's mark, parsed once from the API's text.
+    Identical marks share a single instance.
+    """
+
+    kind: str
+    # mark as written to the exports, e.g. "43" from "43 / 55", or "Not Assessed"
+    raw: str | None
+    value: float | None
+    # "100" for percentages, "55" from "43 / 55"
+    out_of: str | None
+    out_of_value: float | None
+
+
+@dataclass(slots=True)
+class Student:
+    """
+    Represents a student. Each student is stored once in a registry and
+    shared by every assessment they are a participant in.
     """
 
     internal_id: str
@@ -18,12 +42,45 @@ class Participant:
     first_name: str
     preferred_name: str
     last_name: str
-    mark: str
+
+
+@dataclass(slots=True)
+class Participant:
+    """
+    Represents a student in an assessment.
+    """
+
+    student: Student
+    mark: Mark
     comment: str
     # date: str
 
+    @property
+    def internal_id(self) -> str:
+        return self.student.internal_id
+
+    @property
+    def external_id(self) -> str:
+        return self.student.external_id
+
+    @property
+    def title(self) -> str:
+        return self.student.title
 
-@dataclass
+    @property
+    def first_name(self) -> str:
+        return self.student.first_name
+
+    @property
+    def preferred_name(self) -> str:
+        return self.student.preferred_name
+
+    @property
+    def last_name(self) -> str:
+        return self.student.last_name
+
+
+@dataclass(slots=True)
 class YearLevel:
     """
     Represents a year level, e.g. 7, 8, 9, 10, 11, 12, 13.
@@ -34,7 +91,7 @@ class YearLevel:
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Folder:
     """
     A folder is typically a class, e.g. 7PE1, 13DAT2.
@@ -46,7 +103,7 @@ class Folder:
     year_levels: List["YearLevel"]
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkType:
     """
     Represents the type of assessment, e.g. "Assessment task", "Test", "Exam".
@@ -56,7 +113,7 @@ class WorkType:
     name: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class Assessment:
     """
     Represents an assessment.
@@ -74,14 +131,90 @@ class Assessment:
     due_date: str
     participants: List[Participant]
 
+    def in_year_and_date(self, year: int, start_date: str, end_date: str) -> bool:
+        """Check if the assessment belongs to a year group and due date window.
+
+        Args:
+            year (int): Year group
+            start_date (str): First due date in the window, YYYY-MM-DD
+            end_date (str): Last due date in the window, YYYY-MM-DD
+
+        Returns:
+            bool: True if the assessment is in the year group and window
+        """
+        # uses class code, e.g. 7PE1, 13DAT2, could be null
+        return (
+            self.folder.code is not None
+            and (
+                (
+                    isinstance(self.folder.code, str)
+                    and self.folder.code.startswith(str(year))
+                )
+                or (
+                    isinstance(self.folder.code, list)
+                    and any(c.startswith(str(year)) for c in self.folder.code)
+                )
+            )
+            and start_date <= self.due_date
+            and self.due_date <= end_date
+        )
+
+
+@dataclass(slots=True)
+class AssessmentView:
+    """
+    Fields derived from an assessment for the exports, computed once per
+    assessment rather than once per participant row.
+    """
+
+    assessment: Assessment
+    # title with text in curly braces and extra whitespace removed
+    title: str
+    # folder name without the class suffix, e.g. "9 My Subject Name"
+    course: str
+    # year the assessment is due, e.g. "2022"
+    academic_year: str
+    # "100" for percentage marks, Y for "X / Y" marks, or "Not Assessed"
+    mark_out_of: str
+    # title contains "MODIFIED"
+    modified: bool
+
 
 class Result:
     """
     Stores the processed data from an API request.
+    Assessments are indexed by year group prefix and due date the first time
+    they are filtered, so filtering does not need to scan every assessment.
     """
 
-    def __init__(self, data: List["Assessment"]):
+    def __init__(
+        self, data: List["Assessment"], students: Dict[str, "Student"] | None = None
+    ):
         self.data = data
+        # external id -> student, shared by every participant
+        self.students = {} if students is None else students
+        self._year_index: Dict[str, Tuple[List[str], List[int]]] | None = None
+
+    @property
+    def year_index(self) -> Dict[str, Tuple[List[str], List[int]]]:
+        """Year prefix -> (sorted due dates, positions in data sorted by due date),
+        built on first use."""
+        if self._year_index is None:
+            entries: Dict[str, List[Tuple[str, int]]] = {}
+            for position, assessment in enumerate(self.data):
+                for prefix in year_prefixes(assessment.folder.code):
+                    entries.setdefault(prefix, []).append(
+                        (assessment.due_date, position)
+                    )
+            index = {}
+            for prefix, items in entries.items():
+                items.sort()
+                index[prefix] = (
+                    [due_date for due_date, _ in items],
+                    [position for _, position in items],
+                )
+            self._year_index = index
+        return self._year_index
 
     def filter_by_year_and_date(
         self, year: int, start_date: str, end_date: str
@@ -91,23 +224,73 @@ class Result:
         Returns:
             List["Assessment"]: All assessments in the given year group.
         """
-        # filter all assessments based on year group
-        # uses class code, e.g. 7PE1, 13DAT2, could be null
-        return list(
-            filter(
-                lambda a: a.folder.code is not None
-                and (
-                    (
-                        isinstance(a.folder.code, str)
-                        and a.folder.code.startswith(str(year))
-                    )
-                    or (
-                        isinstance(a.folder.code, list)
-                        and any(c.startswith(str(year)) for c in a.folder.code)
-                    )
-                )
-                and start_date <= a.due_date
-                and a.due_date <= end_date,
-                self.data,
-            )
-        )
+        return self.filter_by_years_and_date([year], start_date, end_date)
+
+    def filter_by_years_and_date(
+        self, years: Iterable[int], start_date: str, end_date: str
+    ) -> List["Assessment"]:
+        """Filter results by several year groups at once.
+
+        Args:
+            years (Iterable[int]): Year groups to include
+            start_date (str): First due date in the window, YYYY-MM-DD
+            end_date (str): Last due date in the window, YYYY-MM-DD
+
+        Returns:
+            List["Assessment"]: Assessments in any of the year groups, in their original order
+        """
+        positions = set()
+        for year in years:
+            if str(year) not in self.year_index:
+                continue
+            due_dates, indexed = self.year_index[str(year)]
+            first = bisect_left(due_dates, start_date)
+            last = bisect_right(due_dates, end_date)
+            positions.update(indexed[first:last])
+
+        return [self.data[position] for position in sorted(positions)]
+
+    def partition_by_years(
+        self, years: Iterable[int], start_date: str, end_date: str
+    ) -> Dict[int, List["Assessment"]]:
+        """Split results into year groups using the index.
+
+        Args:
+            years (Iterable[int]): Year groups to partition into
+            start_date (str): First due date in the window, YYYY-MM-DD
+            end_date (str): Last due date in the window, YYYY-MM-DD
+
+        Returns:
+            Dict[int, List["Assessment"]]: Assessments for each year group, in their original order
+        """
+        return {
+            year: self.filter_by_year_and_date(year, start_date, end_date)
+            for year in years
+        }
+
+
+def year_prefixes(code: str | List[str] | None) -> Set[str]:
+    """Get every year group prefix a folder code matches.
+
+    A code such as "13DAT2" starts with "1" and "13", so it is indexed under
+    both, matching `str.startswith` for any year.
+
+    Args:
+        code (str | List[str] | None): Class code, a list of class codes, or None
+
+    Returns:
+        Set[str]: Leading digit prefixes of the code(s)
+    """
+    if isinstance(code, str):
+        codes = [code]
+    elif isinstance(code, list):
+        codes = code
+    else:
+        return set()
+
+    prefixes = set()
+    for c in codes:
+        digits = len(c) - len(c.lstrip("0123456789"))
+        for end in range(1, digits + 1):
+            prefixes.add(c[:end])
+    return prefixes
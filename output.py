@@ -0,0 +1,216 @@
+"""
+Output files for the exports. Each file is written whole, or split into
+chunks capped by rows or bytes, each with its own header, so large imports
+can be run and retried one chunk at a time.
+
+Chunking is turned on by OUTPUT_CHUNK_ROWS and/or OUTPUT_CHUNK_MB. Chunks are
+written by a shared pool of OUTPUT_WRITERS threads, gzipped if OUTPUT_GZIP=1,
+and listed with their row counts and checksums in a manifest next to them.
+"""
+
+import concurrent.futures
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+from typing import List, Tuple
+
+WRITE_BUFFER = 1 << 20
+
+
+def write_chunk(path: str, header: bytes, body: List[bytes], compress: bool) -> dict:
+    """Write one chunk and describe it for the manifest.
+
+    Args:
+        path (str): File to write
+        header (bytes): Header line, already encoded
+        body (List[bytes]): Rows, already encoded
+        compress (bool): Gzip the chunk
+
+    Returns:
+        dict: File name, bytes and SHA-256 of the file as written
+    """
+    data = header + b"".join(body)
+    if compress:
+        data = gzip.compress(data, compresslevel=6)
+    with open(path, "wb", buffering=WRITE_BUFFER) as f:
+        f.write(data)
+    return {
+        "file": os.path.basename(path),
+        "bytes": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+class ChunkedFile:
+    """
+    Stands in for an output file and its csv.writer, starting a new chunk
+    whenever the next row would take the current one over the row or byte cap.
+    The byte cap counts the header and UTF-8 bytes, before any gzip; a row
+    bigger than the cap on its own gets a chunk to itself.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        delimiter: str,
+        header: List[str],
+        max_rows: int,
+        max_bytes: int,
+        compress: bool,
+        executor: concurrent.futures.Executor,
+        max_pending: int,
+    ):
+        self.name = path
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.executor = executor
+        self.max_pending = max_pending
+        self.base, self.extension = os.path.splitext(path)
+        # Parts left over from an earlier, longer run would look like part of this one
+        pattern = f"{glob.escape(self.base)}.part*{glob.escape(self.extension)}"
+        for old in glob.glob(pattern) + glob.glob(pattern + ".gz"):
+            os.remove(old)
+
+        # Formats one row at a time, so its size is known before it's added
+        self.buffer = io.StringIO(newline="")
+        self.writer = csv.writer(self.buffer, delimiter=delimiter)
+        self.header = self.format(header)
+
+        self.body: List[bytes] = []
+        self.size = len(self.header)
+        self.rows = 0
+        # rows in each chunk, and the pending write of each chunk
+        self.chunks: List[Tuple[int, concurrent.futures.Future]] = []
+
+    def format(self, row: list) -> bytes:
+        self.writer.writerow(row)
+        line = self.buffer.getvalue().encode("UTF-8")
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return line
+
+    def writerow(self, row: list) -> None:
+        line = self.format(row)
+        if self.rows and self.max_bytes and self.size + len(line) > self.max_bytes:
+            self.flush()
+        self.body.append(line)
+        self.size += len(line)
+        self.rows += 1
+        if self.max_rows and self.rows >= self.max_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the rows so far to the writer pool as a chunk of their own."""
+        body = self.body
+        self.body = []
+        self.size = len(self.header)
+
+        part = f"{self.base}.part{len(self.chunks) + 1:03}{self.extension}"
+        if self.compress:
+            part += ".gz"
+        # Don't let chunks pile up in memory faster than they can be written
+        pending = [future for _, future in self.chunks if not future.done()]
+        if len(pending) >= self.max_pending:
+            concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+        self.chunks.append(
+            (
+                self.rows,
+                self.executor.submit(
+                    write_chunk, part, self.header, body, self.compress
+                ),
+            )
+        )
+        self.rows = 0
+
+    def close(self) -> None:
+        """Write the last chunk, wait for every chunk and write the manifest."""
+        # An empty export still gets one chunk with just the header
+        if self.rows or not self.chunks:
+            self.flush()
+
+        chunks = []
+        for rows, future in self.chunks:
+            chunk = future.result()
+            chunk["rows"] = rows
+            chunks.append(chunk)
+
+        # Keep the extension, as e.g. tasks.txt and tasks.csv share a base name
+        with open(f"{self.name}.manifest.json", "w", encoding="UTF-8") as f:
+            json.dump(
+                {
+                    "file": os.path.basename(self.name),
+                    "rows": sum(chunk["rows"] for chunk in chunks),
+                    "chunks": chunks,
+                },
+                f,
+                indent=4,
+            )
+
+
+_pool: concurrent.futures.ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_writer_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """Get the thread pool shared by every chunked file, starting it on first use.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The shared pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=writer_count(), thread_name_prefix="output"
+            )
+        return _pool
+
+
+def writer_count() -> int:
+    # read from the OUTPUT_WRITERS environment variable
+    return int(os.getenv("OUTPUT_WRITERS", "4"))
+
+
+def open_table(path: str, delimiter: str, header: List[str]):
+    """Open an output file and write its header.
+
+    The file is split into chunks if OUTPUT_CHUNK_ROWS or OUTPUT_CHUNK_MB is set.
+
+    Args:
+        path (str): File to write, or the name chunks are numbered after
+        delimiter (str): Column delimiter
+        header (List[str]): Names of the columns
+
+    Returns:
+        Tuple[file | ChunkedFile, csv.writer | ChunkedFile]: Object with name and
+            close(), and object with writerow()
+    """
+    max_rows = int(os.getenv("OUTPUT_CHUNK_ROWS", "0"))
+    max_bytes = int(float(os.getenv("OUTPUT_CHUNK_MB", "0")) * 1024 * 1024)
+    if max_rows or max_bytes:
+        chunked = ChunkedFile(
+            path,
+            delimiter,
+            header,
+            max_rows,
+            max_bytes,
+            os.getenv("OUTPUT_GZIP", "0") == "1",
+            get_writer_pool(),
+            writer_count() * 2,
+        )
+        return chunked, chunked
+
+    f = open(  # pylint: disable=consider-using-with
+        path, "w", newline="", encoding="UTF-8", buffering=WRITE_BUFFER
+    )
+    writer = csv.writer(f, delimiter=delimiter)
+    writer.writerow(header)
+    return f, writer
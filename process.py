@@ -2,107 +2,261 @@
 Process data from the API into a Result object.
 """
 
+import re
 from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Sized
 
-from progress.bar import Bar
+from display import bar as create_bar
+from display import spinner as create_spinner
+from metrics import get_metrics
+from model import (
+    FRACTION,
+    NOT_ASSESSED,
+    PERCENTAGE,
+    UNKNOWN,
+    Assessment,
+    AssessmentView,
+    Folder,
+    Mark,
+    Participant,
+    Result,
+    Student,
+    WorkType,
+)
 
-from model import Assessment, Folder, Participant, Result, WorkType
+CURLY_BRACES = re.compile(r"\{.*?\}")
+WHITESPACE = re.compile(r"\s+")
 
 
-def parse_json(assessment_data: list[dict], mode: str) -> Result:
+def to_number(text: str) -> float | None:
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=65536)
+def parse_mark(mark: str | None) -> Mark:
+    """Parse a mark from the API, e.g. "43 / 55", "86.42 %" or "Not Assessed".
+
+    Args:
+        mark (str | None): Mark as returned by the API
+
+    Returns:
+        Mark: The parsed mark, shared between participants with the same mark
+    """
+    if mark is None:
+        return Mark(UNKNOWN, None, None, None, None)
+    if " %" in mark:
+        # "86.42 %"
+        raw = mark.split(" %")[0]
+        return Mark(PERCENTAGE, raw, to_number(raw), "100", 100.0)
+    if " / " in mark:
+        # "43 / 55"
+        raw, out_of = mark.split(" / ")[0:2]
+        return Mark(FRACTION, raw, to_number(raw), out_of, to_number(out_of))
+    if mark == "Not Assessed":
+        return Mark(NOT_ASSESSED, mark, None, None, None)
+    return Mark(UNKNOWN, mark, None, None, None)
+
+
+@lru_cache(maxsize=4096)
+def parse_due_date(due_date: str) -> str:
+    """Convert a due date from the API, e.g. "2023-02-24T14:40:24+11:00", to YYYY-MM-DD.
+
+    Many tasks share a due date, so each distinct value is only parsed once.
+
+    Args:
+        due_date (str): Due date as returned by the API
+
+    Returns:
+        str: The date in the timezone it was given in
+    """
+    return datetime.fromisoformat(due_date).strftime("%Y-%m-%d")
+
+
+def parse_task(
+    task: dict, mode: str, students: Dict[str, Student]
+) -> Assessment | None:
+    """Parse a single task from the API into an Assessment.
+
+    Args:
+        task (dict): JSON data for one task
+        mode (str): Mode of the program
+        students (Dict[str, Student]): Registry of students by external id,
+            new students are added to it
+
+    Returns:
+        Assessment | None: The assessment, or None if it should be skipped in this mode
+    """
+    if task["workType"] is None:
+        work_type = WorkType(None, None)
+    else:
+        work_type = WorkType(task["workType"]["id"], task["workType"]["name"])
+
+    folder = Folder(
+        task["folder"]["id"],
+        task["folder"]["name"],
+        task["folder"]["code"],
+        task["folder"]["yearLevel"],
+    )
+
+    participants = []
+    if mode != "All tasks overview":
+        if task["participants"] is None or len(task["participants"]) == 0:
+            return None
+        for student in task["participants"]:
+            # change format of date from 2023-02-24T14:40:24+11:00 to YYYY-MM-DD
+            # raw_p_date = datetime.strptime(p["response"]["date"], "%Y-%m-%dT%H:%M:%S%z")
+            # p_date = raw_p_date.strftime("%Y-%m-%d")
+
+            if "feedback" not in student or student["feedback"] is None:
+                continue
+
+            if (
+                student["instructor"] is not None
+                and student["learner"]["externalId"]
+                == student["instructor"]["externalId"]
+            ):
+                continue
+
+            if (
+                student["feedback"]["instructor"] is not None
+                and student["learner"]["externalId"]
+                == student["feedback"]["instructor"]["externalId"]
+            ):
+                continue
+
+            learner = student["learner"]
+            registered = students.get(learner["externalId"])
+            if registered is None:
+                registered = Student(
+                    learner["id"],
+                    learner["externalId"],
+                    learner["title"],
+                    learner["firstName"],
+                    learner["preferredName"],
+                    learner["lastName"],
+                )
+                students[learner["externalId"]] = registered
+
+            participant = Participant(
+                registered,
+                parse_mark(student["feedback"]["mark"]),
+                student["feedback"]["comment"],
+                # p_date,
+            )
+            participants.append(participant)
+
+    date = parse_due_date(task["dueDate"])
+    assessment = Assessment(
+        task["id"],
+        task["title"],
+        task["assessmentType"],
+        task["commonAssessment"],
+        work_type,
+        folder,
+        task["subjectCode"],
+        task["project"],
+        task["weight"],
+        date,
+        participants,
+    )
+
+    if mode != "All tasks overview" and (
+        assessment.weight == 0 or assessment.weight is None
+    ):
+        return None
+
+    metrics = get_metrics()
+    metrics.count("assessments_parsed")
+    metrics.count("participants_parsed", len(participants))
+    return assessment
+
+
+def parse_json(assessment_data: Iterable[dict], mode: str) -> Result:
     """Parse JSON data from the API into a Result object.
 
     Args:
-        data (dict): JSON data from the API
+        assessment_data (Iterable[dict]): JSON data from the API, either a list or
+            a lazy iterator such as one reading back an archive
         mode (str): Mode of the program
 
     Returns:
         Result: Result object containing assessments and metadata
     """
+    if isinstance(assessment_data, Sized):
+        bar = create_bar("Processing data from API", len(assessment_data))
+    else:
+        bar = create_spinner("Processing data from archive... ")
 
-    count = len(assessment_data)
-    bar = Bar("Processing data from API", max=count)
-
+    count = 0
     assessments = []
+    students: Dict[str, Student] = {}
     for task in assessment_data:
         bar.next()
-        if task["workType"] is None:
-            work_type = WorkType(None, None)
-        else:
-            work_type = WorkType(task["workType"]["id"], task["workType"]["name"])
-
-        folder = Folder(
-            task["folder"]["id"],
-            task["folder"]["name"],
-            task["folder"]["code"],
-            task["folder"]["yearLevel"],
-        )
-
-        participants = []
-        if mode != "All tasks overview":
-            if task["participants"] is None or len(task["participants"]) == 0:
-                count -= 1  # Keep the count accurate
-                continue
-            for student in task["participants"]:
-                # change format of date from 2023-02-24T14:40:24+11:00 to YYYY-MM-DD
-                # raw_p_date = datetime.strptime(p["response"]["date"], "%Y-%m-%dT%H:%M:%S%z")
-                # p_date = raw_p_date.strftime("%Y-%m-%d")
-
-                if "feedback" not in student or student["feedback"] is None:
-                    continue
-
-                if (
-                    student["instructor"] is not None
-                    and student["learner"]["externalId"]
-                    == student["instructor"]["externalId"]
-                ):
-                    continue
-
-                if (
-                    student["feedback"]["instructor"] is not None
-                    and student["learner"]["externalId"]
-                    == student["feedback"]["instructor"]["externalId"]
-                ):
-                    continue
-
-                participant = Participant(
-                    student["learner"]["id"],
-                    student["learner"]["externalId"],
-                    student["learner"]["title"],
-                    student["learner"]["firstName"],
-                    student["learner"]["preferredName"],
-                    student["learner"]["lastName"],
-                    student["feedback"]["mark"],
-                    student["feedback"]["comment"],
-                    # p_date,
-                )
-                participants.append(participant)
-
-        raw_date = datetime.strptime(task["dueDate"], "%Y-%m-%dT%H:%M:%S%z")
-        date = raw_date.strftime("%Y-%m-%d")
-        assessment = Assessment(
-            task["id"],
-            task["title"],
-            task["assessmentType"],
-            task["commonAssessment"],
-            work_type,
-            folder,
-            task["subjectCode"],
-            task["project"],
-            task["weight"],
-            date,
-            participants,
-        )
-
-        if mode != "All tasks overview" and (
-            assessment.weight == 0 or assessment.weight is None
-        ):
-            count -= 1
+        count += 1
+        assessment = parse_task(task, mode, students)
+        if assessment is None:
+            count -= 1  # Keep the count accurate
             continue
 
         assessments.append(assessment)
 
     assert count == len(assessments)
-    result = Result(assessments)
+    result = Result(assessments, students)
     bar.finish()
     return result
+
+
+def parse_stream(tasks: Iterable[dict], mode: str) -> Iterator[Assessment]:
+    """Parse tasks into Assessments one at a time, as they arrive from the API.
+
+    Args:
+        tasks (Iterable[dict]): JSON data for each task
+        mode (str): Mode of the program
+
+    Yields:
+        Assessment: Each assessment that is not skipped in this mode
+    """
+    students: Dict[str, Student] = {}
+    for task in tasks:
+        assessment = parse_task(task, mode, students)
+        if assessment is not None:
+            yield assessment
+
+
+def normalize(assessment: Assessment) -> AssessmentView:
+    """Compute the fields the exports derive from an assessment.
+
+    Args:
+        assessment (Assessment): Parsed assessment
+
+    Returns:
+        AssessmentView: The assessment with its derived export fields
+    """
+    # filter out any text enclosed in curly braces from the title using regex
+    # remove any double spaces
+    # remove any leading or trailing whitespace
+    title = CURLY_BRACES.sub("", assessment.title)
+    title = WHITESPACE.sub(" ", title).strip()
+
+    # assessment.participants contains all students,
+    # which have a mark in the format "X / Y" or "X %" or "Not Assessed"
+    mark_out_of = "Not Assessed"
+    for participant in assessment.participants:
+        if participant.mark.out_of is not None:
+            mark_out_of = participant.mark.out_of
+            break
+
+    return AssessmentView(
+        assessment,
+        title,
+        # example course name "9 My Subject Name 1C", remove " 1C"
+        " ".join(assessment.folder.name.split(" ")[:-1]),
+        # get year from due date in format 2022-03-09
+        assessment.due_date.split("-")[0],
+        mark_out_of,
+        "MODIFIED" in title.upper(),
+    )
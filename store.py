@@ -0,0 +1,235 @@
+"""
+Local store of assessments fetched from the API, used for incremental syncs,
+and of the rows already exported to Edumate, used for delta exports.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+
+class Store:
+    """
+    Keeps the raw JSON of every assessment (including its participants) for a
+    due date window, along with the time that window was last synced and what
+    the API said about each shard of it, to tell which shards have changed.
+    """
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS assessments (
+                    window TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    due_date TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (window, id)
+                )
+                """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    window TEXT PRIMARY KEY,
+                    synced_at TEXT NOT NULL
+                )
+                """)
+            # When each due date shard of a window was last fetched, its count
+            # and the ETag / Last-Modified and cursor of each of its pages
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS shards (
+                    window TEXT NOT NULL,
+                    shard TEXT NOT NULL,
+                    fetched_at TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    pages TEXT NOT NULL,
+                    PRIMARY KEY (window, shard)
+                )
+                """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS ledger (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    hash BLOB NOT NULL,
+                    due_date TEXT NOT NULL,
+                    PRIMARY KEY (scope, key)
+                )
+                """)
+
+    def watermark(self, window: str) -> datetime | None:
+        """Get the time a window was last synced.
+
+        Args:
+            window (str): Window key
+
+        Returns:
+            datetime | None: Time of the last sync, or None if never synced
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT synced_at FROM watermarks WHERE window = ?", (window,)
+            ).fetchone()
+        if row is None:
+            return None
+        return datetime.fromisoformat(row[0])
+
+    def shards(self, window: str) -> Dict[str, Tuple[datetime, int, List[dict]]]:
+        """Get what was fetched for each shard of a window.
+
+        Args:
+            window (str): Window key
+
+        Returns:
+            Dict[str, Tuple[datetime, int, List[dict]]]: Shard key -> time it was
+                fetched, number of assessments and the validators of each page
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT shard, fetched_at, count, pages FROM shards WHERE window = ?",
+                (window,),
+            ).fetchall()
+        return {
+            shard: (datetime.fromisoformat(fetched_at), count, json.loads(pages))
+            for shard, fetched_at, count, pages in rows
+        }
+
+    def update(
+        self,
+        window: str,
+        tasks: Iterable[dict],
+        synced_at: datetime,
+        slices: List[Tuple[str, str]] | None = None,
+        shards: Dict[str, Tuple[int, List[dict]]] | None = None,
+    ) -> None:
+        """Merge fetched assessments into a window and move its watermark.
+
+        Stored assessments due in a fetched slice that were not fetched again
+        are removed, as they no longer exist in the API.
+
+        Args:
+            window (str): Window key
+            tasks (Iterable[dict]): Assessments as returned by the API
+            synced_at (datetime): Time the fetch started
+            slices (List[Tuple[str, str]] | None, optional): First and last due date
+                of each slice fetched, YYYY-MM-DD. Defaults to None, which replaces
+                the whole window.
+            shards (Dict[str, Tuple[int, List[dict]]] | None, optional): Count and
+                page validators of each shard fetched. Defaults to None.
+        """
+        rows = [
+            (window, task["id"], task["dueDate"], json.dumps(task)) for task in tasks
+        ]
+        fetched = [row[1] for row in rows]
+
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS fetched (id)")
+            self.connection.execute("DELETE FROM fetched")
+            self.connection.executemany(
+                "INSERT INTO fetched VALUES (?)", ((i,) for i in fetched)
+            )
+            if slices is None:
+                self.connection.execute(
+                    "DELETE FROM assessments WHERE window = ? "
+                    "AND id NOT IN (SELECT id FROM fetched)",
+                    (window,),
+                )
+            else:
+                # The dueDate filter is greedy, so only remove assessments whose
+                # local due date is inside a slice that was fetched
+                self.connection.executemany(
+                    "DELETE FROM assessments WHERE window = ? "
+                    "AND substr(due_date, 1, 10) BETWEEN ? AND ? "
+                    "AND id NOT IN (SELECT id FROM fetched)",
+                    ((window, first, last) for first, last in slices),
+                )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO assessments VALUES (?, ?, ?, ?)", rows
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO shards VALUES (?, ?, ?, ?, ?)",
+                (
+                    (window, shard, synced_at.isoformat(), count, json.dumps(pages))
+                    for shard, (count, pages) in (shards or {}).items()
+                ),
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?)",
+                (window, synced_at.isoformat()),
+            )
+
+    def tasks(self, window: str) -> List[dict]:
+        """Get every stored assessment for a window, in due date order.
+
+        Args:
+            window (str): Window key
+
+        Returns:
+            List[dict]: Assessments in the same format as the API returns them
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT data FROM assessments WHERE window = ? ORDER BY due_date, id",
+                (window,),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def ledger(self, scope: str) -> Dict[str, Tuple[bytes, str]]:
+        """Get the hash of every row exported in a scope.
+
+        Args:
+            scope (str): Ledger scope, e.g. "9:marks"
+
+        Returns:
+            Dict[str, Tuple[bytes, str]]: Row key -> content hash and due date
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key, hash, due_date FROM ledger WHERE scope = ?", (scope,)
+            ).fetchall()
+        return {key: (row_hash, due_date) for key, row_hash, due_date in rows}
+
+    def update_ledger(
+        self,
+        scope: str,
+        exported: Iterable[Tuple[str, bytes, str]],
+        removed: Iterable[str],
+    ) -> None:
+        """Record rows exported in a scope and forget removed ones, in one transaction.
+
+        Args:
+            scope (str): Ledger scope, e.g. "9:marks"
+            exported (Iterable[Tuple[str, bytes, str]]): Key, content hash and due
+                date of each new or changed row
+            removed (Iterable[str]): Keys of rows that no longer exist
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM ledger WHERE scope = ? AND key = ?",
+                ((scope, key) for key in removed),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO ledger VALUES (?, ?, ?, ?)",
+                ((scope, key, row_hash, due) for key, row_hash, due in exported),
+            )
+
+
+_store: Store | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Store:
+    """Get the shared store, opening it on first use.
+
+    The database path is read from the STORE_PATH environment variable.
+
+    Returns:
+        Store: The shared store
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = Store(os.getenv("STORE_PATH", "store.sqlite3"))
+        return _store
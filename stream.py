@@ -0,0 +1,58 @@
+"""
+Helpers to stream data between the fetch, parse and export stages.
+"""
+
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Error:
+    """
+    Carries an exception from a producer thread to the consuming thread.
+    """
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _drain(items: queue.Queue) -> Iterator:
+    while True:
+        item = items.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _Error):
+            raise item.error
+        yield item
+
+
+def prefetch(iterable: Iterable[T], depth: int = 1) -> Iterator[T]:
+    """Read ahead from an iterable in a background thread.
+
+    While the caller works on one item, the next `depth` items are already
+    being produced, e.g. the next page is downloaded while this one is parsed.
+
+    Args:
+        iterable (Iterable[T]): Source of items
+        depth (int, optional): Items to read ahead. Defaults to 1.
+
+    Yields:
+        T: Items from the source, in order
+    """
+    items: queue.Queue = queue.Queue(maxsize=depth)
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as error:  # pylint: disable=broad-except
+            items.put(_Error(error))
+            return
+        items.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    yield from _drain(items)
@@ -0,0 +1,123 @@
+"""
+Checks delta exports only write what changed since the last delta export,
+without touching the files of earlier runs.
+"""
+
+import copy
+import csv
+import gzip
+import json
+import os
+
+import pytest
+
+import store
+from export import export_mode
+from model import year_prefixes
+from process import parse_json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+START = "2024-01-29"
+END = "2024-11-24"
+YEAR = 9
+MODE = "Markbook export"
+
+
+@pytest.fixture(name="tasks")
+def fixture_tasks():
+    with gzip.open(os.path.join(HERE, "fixtures", "tasks.json.gz"), "rt") as f:
+        return json.load(f)
+
+
+@pytest.fixture(autouse=True)
+def ledger_store(monkeypatch, tmp_path):
+    for name in ["OUTPUT_CHUNK_ROWS", "OUTPUT_CHUNK_MB"]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(store, "_store", store.Store(str(tmp_path / "store.sqlite3")))
+
+
+@pytest.fixture(name="directory")
+def fixture_directory(tmp_path):
+    directory = tmp_path / "out"
+    directory.mkdir()
+    return directory
+
+
+def export(tasks, directory):
+    """Run a delta export and get the files it wrote, by kind."""
+    before = set(os.listdir(directory))
+    result = parse_json(tasks, MODE)
+    assessments = result.filter_by_year_and_date(YEAR, START, END)
+    export_mode(MODE, assessments, YEAR, START, END, directory, delta=True)
+    written = {}
+    for filename in set(os.listdir(directory)) - before:
+        assert filename.startswith(f"{YEAR}_{START}_{END}_delta_")
+        kind = filename.split("_", 5)[5]
+        with open(os.path.join(directory, filename), encoding="UTF-8") as f:
+            written[kind] = list(
+                csv.reader(f, delimiter="," if ".csv" in kind else "\t")
+            )
+    return written
+
+
+def year_tasks(tasks):
+    return [
+        task
+        for task in tasks
+        if str(YEAR) in year_prefixes(task["folder"]["code"])
+        and task["weight"]
+        and any(
+            p["feedback"] and " / " in (p["feedback"]["mark"] or "")
+            for p in task["participants"]
+        )
+    ]
+
+
+def test_rerun_keeps_earlier_delta(tasks, directory):
+    first = export(tasks, str(directory))
+    assert len(first["marks.txt"]) > 1
+    assert len(first["tasks.txt"]) > 1
+    assert "removed_marks.csv" not in first
+    snapshot = {
+        filename: (directory / filename).read_bytes()
+        for filename in os.listdir(directory)
+    }
+
+    second = export(tasks, str(directory))
+    # Nothing changed, and the first run's files are still there as written
+    assert len(second["marks.txt"]) == 1
+    assert len(second["tasks.txt"]) == 1
+    assert "removed_marks.csv" not in second
+    for filename, data in snapshot.items():
+        assert (directory / filename).read_bytes() == data
+
+
+def test_changed_and_removed(tasks, directory):
+    export(tasks, str(directory))
+
+    tasks = copy.deepcopy(tasks)
+    changed, removed = year_tasks(tasks)[:2]
+    participant = next(
+        p
+        for p in changed["participants"]
+        if p["feedback"] and " / " in (p["feedback"]["mark"] or "")
+    )
+    out_of = participant["feedback"]["mark"].split(" / ")[1]
+    participant["feedback"]["mark"] = f"{float(out_of) + 1:g} / {out_of}"
+    tasks.remove(removed)
+
+    second = export(tasks, str(directory))
+    student = participant["learner"]["externalId"]
+    assert [row[0] for row in second["marks.txt"][1:]] == [student]
+    assert second["marks.txt"][1][2] == f"{float(out_of) + 1:g}"
+    assert len(second["tasks.txt"]) == 1
+    assert [row[0] for row in second["removed_tasks.csv"][1:]] == [
+        removed["title"].strip()
+    ]
+    assert len(second["removed_marks.csv"]) > 1
+
+    # Removals are only reported once
+    third = export(tasks, str(directory))
+    assert "removed_tasks.csv" not in third
+    assert "removed_marks.csv" not in third
+    assert len(third["marks.txt"]) == 1
@@ -0,0 +1,75 @@
+"""
+Checks every export writes the same bytes as the original generators, from
+golden files written by them for a fixed set of synthetic tasks.
+"""
+
+import filecmp
+import gzip
+import json
+import os
+
+import pytest
+
+from export import export_mode, export_year_groups
+from process import parse_json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+START = "2024-01-29"
+END = "2024-11-24"
+YEARS = [9, 12]
+MODES = {
+    "overview": "All tasks overview",
+    "comments": "Comments export",
+    "markbook": "Markbook export",
+}
+
+
+@pytest.fixture(name="tasks", scope="module")
+def fixture_tasks():
+    with gzip.open(os.path.join(HERE, "fixtures", "tasks.json.gz"), "rt") as f:
+        return json.load(f)
+
+
+@pytest.fixture(autouse=True)
+def whole_files(monkeypatch):
+    for name in ["OUTPUT_CHUNK_ROWS", "OUTPUT_CHUNK_MB"]:
+        monkeypatch.delenv(name, raising=False)
+
+
+def assert_matches_golden(name: str, directory: str) -> None:
+    golden = os.path.join(HERE, "golden", name)
+    expected = sorted(os.listdir(golden))
+    assert sorted(os.listdir(directory)) == expected
+    for filename in expected:
+        assert filecmp.cmp(
+            os.path.join(golden, filename),
+            os.path.join(directory, filename),
+            shallow=False,
+        ), f"{filename} differs from the original output"
+
+
+@pytest.mark.parametrize("name", MODES)
+def test_export_mode(name, tasks, tmp_path):
+    result = parse_json(tasks, MODES[name])
+    for year in YEARS:
+        assessments = result.filter_by_year_and_date(year, START, END)
+        export_mode(MODES[name], assessments, year, START, END, str(tmp_path))
+    assert_matches_golden(name, str(tmp_path))
+
+
+@pytest.mark.parametrize("name", MODES)
+def test_export_year_groups(name, tasks, tmp_path):
+    result = parse_json(tasks, MODES[name])
+    partitions = result.partition_by_years(YEARS, START, END)
+    export_year_groups(MODES[name], partitions, START, END, str(tmp_path))
+    assert_matches_golden(name, str(tmp_path))
+
+
+def test_stale_conflicts_removed(tasks, tmp_path):
+    # A run without conflicts doesn't leave an earlier run's report looking current
+    for kind in ["task", "mark"]:
+        (tmp_path / f"9_{START}_{END}_{kind}_conflicts.csv").write_text("status\n")
+    result = parse_json(tasks, MODES["markbook"])
+    partitions = result.partition_by_years(YEARS, START, END)
+    export_year_groups(MODES["markbook"], partitions, START, END, str(tmp_path))
+    assert_matches_golden("markbook", str(tmp_path))
@@ -0,0 +1,42 @@
+"""
+Checks chunked output stays under its caps and holds the same rows as a
+whole file.
+"""
+
+import glob
+import os
+
+from output import open_table
+
+HEADER = ["student_number", "comment"]
+ROWS = [[str(20000 + i), "é" * (i % 40) + " done"] for i in range(5000)]
+
+
+def write(path):
+    f, writer = open_table(path, "\t", HEADER)
+    for row in ROWS:
+        writer.writerow(row)
+    f.close()
+
+
+def test_chunks_stay_under_byte_cap(monkeypatch, tmp_path):
+    monkeypatch.delenv("OUTPUT_CHUNK_ROWS", raising=False)
+    monkeypatch.delenv("OUTPUT_CHUNK_MB", raising=False)
+    write(str(tmp_path / "whole_marks.txt"))
+    whole = (tmp_path / "whole_marks.txt").read_bytes()
+
+    max_bytes = 20000
+    monkeypatch.setenv("OUTPUT_CHUNK_MB", str(max_bytes / 1024 / 1024))
+    write(str(tmp_path / "chunked_marks.txt"))
+    parts = sorted(glob.glob(str(tmp_path / "chunked_marks.part*.txt")))
+    assert len(parts) > 1
+
+    header, body = whole.split(b"\n", 1)
+    rows = b""
+    for part in parts:
+        assert os.path.getsize(part) <= max_bytes
+        with open(part, "rb") as f:
+            data = f.read()
+        assert data.startswith(header + b"\n")
+        rows += data[len(header) + 1 :]
+    assert rows == body
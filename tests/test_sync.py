@@ -0,0 +1,116 @@
+"""
+Checks --sync only fetches the months that changed, including marks edited
+on tasks long past their due date, against the mock Schoolbox server.
+"""
+
+import copy
+from datetime import datetime
+
+import pytest
+
+import store
+from benchmarks.mock_server import MockSchoolbox, serve
+from benchmarks.synthetic import make_tasks
+from input import api_headers, sync_window
+from metrics import get_metrics, reset_metrics
+
+START = datetime(2024, 1, 29)
+END = datetime(2024, 11, 24)
+MODE = "Markbook export"
+MONTHS = 11
+
+
+@pytest.fixture(autouse=True)
+def sync_store(monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_TTL", "0")
+    monkeypatch.delenv("SYNC_FULL_EVERY_DAYS", raising=False)
+    monkeypatch.setattr(store, "_store", store.Store(str(tmp_path / "store.sqlite3")))
+
+
+def start_server(etags):
+    api = MockSchoolbox(make_tasks(300, 200, 10), etags=etags)
+    server, host = serve(api)
+    return api, server, host
+
+
+def sync(host):
+    reset_metrics()
+    tasks = sync_window(host, api_headers("x"), START, END, MODE, 4, False)
+    fetched = get_metrics().counters["sync_months_fetched"]
+    return {task["id"]: task for task in tasks}, fetched
+
+
+def edit_old_mark(api):
+    # A mark entered on a task due months before the sync
+    tasks = copy.deepcopy(api.tasks)
+    task = next(
+        task
+        for task in tasks
+        if task["dueDate"] < "2024-03"
+        and task["weight"]
+        and task["workType"] is not None
+        and task["participants"]
+        and any(p["feedback"] for p in task["participants"])
+    )
+    participant = next(p for p in task["participants"] if p["feedback"])
+    participant["feedback"]["mark"] = "99 / 100"
+    api.set_tasks(tasks)
+    return task["id"]
+
+
+def test_sync_with_etags():
+    api, server, host = start_server(etags=True)
+    try:
+        first, fetched = sync(host)
+        assert fetched == MONTHS
+
+        requests = api.requests
+        again, fetched = sync(host)
+        assert fetched == 0
+        assert again == first
+        assert api.not_modified == api.requests - requests
+
+        task_id = edit_old_mark(api)
+        edited, fetched = sync(host)
+        assert fetched == 1
+        marks = [
+            p["feedback"]["mark"]
+            for p in edited[task_id]["participants"]
+            if p["feedback"]
+        ]
+        assert "99 / 100" in marks
+    finally:
+        server.shutdown()
+
+
+def test_sync_without_etags(monkeypatch):
+    api, server, host = start_server(etags=False)
+    try:
+        first, fetched = sync(host)
+        assert fetched == MONTHS
+
+        # Nothing due recently and the counts are the same
+        again, fetched = sync(host)
+        assert fetched == 0
+        assert again == first
+
+        # An edited mark doesn't change the count, so waits for the months to age
+        task_id = edit_old_mark(api)
+        monkeypatch.setenv("SYNC_FULL_EVERY_DAYS", "0")
+        edited, fetched = sync(host)
+        assert fetched == MONTHS
+        marks = [
+            p["feedback"]["mark"]
+            for p in edited[task_id]["participants"]
+            if p["feedback"]
+        ]
+        assert "99 / 100" in marks
+
+        # A removed task changes its month's count
+        monkeypatch.delenv("SYNC_FULL_EVERY_DAYS")
+        api.set_tasks([task for task in api.tasks if task["id"] != task_id])
+        removed, fetched = sync(host)
+        assert fetched == 1
+        assert task_id not in removed
+    finally:
+        server.shutdown()
@@ -0,0 +1,315 @@
+"""
+Long-running mode that polls the API on an interval and regenerates only
+the year group and mode outputs affected by assessments that changed.
+
+Every page is requested with the ETag / Last-Modified it had last time, so
+when nothing has changed an idle poll is a handful of empty 304 responses.
+If the server doesn't send validators, a one-task request checks whether
+the number of assessments changed, and the full window is fetched again
+every WATCH_FULL_EVERY polls to catch edited marks.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Set, Tuple
+
+from dotenv import load_dotenv
+
+from cache import get_cache
+from export import export_year_groups
+from input import (
+    api_headers,
+    build_params,
+    conditional_headers,
+    make_request,
+    probe_count,
+)
+from metrics import reset_metrics
+from model import year_prefixes
+from process import parse_json
+
+# Modes that share an API query, and so a poll
+QUERIES = {
+    "overview": ["All tasks overview"],
+    "assessment": ["Comments export", "Markbook export"],
+}
+
+
+def log(message: str) -> None:
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+class StoredPage:
+    """
+    A page from the last poll, with the validators to send for it next time.
+    """
+
+    def __init__(self, params: Dict[str, str | int], response, page: dict):
+        self.params = dict(params)
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.page = page
+
+
+class Watcher:
+    """
+    Polls each query the watched modes need and exports the year groups
+    whose assessments were added, changed or removed since the last poll.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        headers: Dict[str, str],
+        start_date: datetime,
+        end_date: datetime,
+        modes: List[str],
+        year_groups: List[int],
+        output_dir: str = ".",
+        full_every: int = 10,
+    ):
+        self.host = host
+        self.headers = headers
+        self.start_date = start_date
+        self.end_date = end_date
+        self.year_groups = year_groups
+        self.output_dir = output_dir
+        if full_every < 1:
+            raise ValueError("WATCH_FULL_EVERY must be at least 1")
+        self.full_every = full_every
+        self.queries = {
+            kind: [mode for mode in modes if mode in query_modes]
+            for kind, query_modes in QUERIES.items()
+            if any(mode in query_modes for mode in modes)
+        }
+
+        self.polls = 0
+        # query -> pages from the last poll
+        self.pages: Dict[str, List[StoredPage]] = {}
+        # query -> assessment id -> content hash and watched years it belongs to
+        self.hashes: Dict[str, Dict[int, Tuple[bytes, Set[int]]]] = {}
+
+    def request(self, params: Dict[str, str | int], stored: StoredPage | None):
+        validators = None
+        if stored is not None and stored.params == params:
+            validators = {"etag": stored.etag, "last_modified": stored.last_modified}
+        response = make_request(
+            self.host, params, conditional_headers(self.headers, validators)
+        )
+        if response.status_code not in (200, 304):
+            raise ValueError(
+                f"API returned status {response.status_code}: {response.text}"
+            )
+        return response
+
+    def probe_count(self, kind: str, previous: List[StoredPage]) -> bool:
+        """Check whether the number of assessments in a query has changed.
+
+        Args:
+            kind (str): Query to check
+            previous (List[StoredPage]): Pages from the last poll
+
+        Returns:
+            bool: Whether the count is different
+        """
+        params = build_params(self.start_date, self.end_date, self.queries[kind][0])
+        count = probe_count(self.host, params, self.headers)
+        return count != previous[0].page["metadata"]["count"]
+
+    def poll(self, kind: str) -> Tuple[List[StoredPage], List[dict] | None, str]:
+        """Fetch a query again, re-using every page the server says is unchanged.
+
+        Args:
+            kind (str): Query to poll
+
+        Returns:
+            Tuple[List[StoredPage], List[dict] | None, str]: Pages to keep once the
+                changes are exported, the assessments, or None if nothing changed,
+                and why
+        """
+        previous = self.pages.get(kind, [])
+        has_validators = any(p.etag or p.last_modified for p in previous)
+        if previous and not has_validators and self.polls % self.full_every:
+            if not self.probe_count(kind, previous):
+                return previous, None, "count unchanged"
+
+        params = build_params(self.start_date, self.end_date, self.queries[kind][0])
+        pages: List[StoredPage] = []
+        not_modified = 0
+        while True:
+            stored = previous[len(pages)] if len(pages) < len(previous) else None
+            response = self.request(params, stored)
+            if response.status_code == 304:
+                not_modified += 1
+                pages.append(stored)
+            else:
+                pages.append(StoredPage(params, response, response.json()))
+
+            cursor = pages[-1].page["metadata"]["cursor"]
+            if cursor is None:
+                break
+            params["cursor"] = cursor
+
+        if not_modified == len(pages) == len(previous):
+            return pages, None, f"{not_modified} pages not modified"
+
+        tasks = []
+        seen = set()
+        for stored in pages:
+            for task in stored.page["data"]:
+                if task["id"] not in seen:
+                    seen.add(task["id"])
+                    tasks.append(task)
+        return (
+            pages,
+            tasks,
+            f"{len(pages) - not_modified} of {len(pages)} pages changed",
+        )
+
+    def affected(
+        self, kind: str, tasks: List[dict]
+    ) -> Tuple[Set[int], str, Dict[int, Tuple[bytes, Set[int]]]]:
+        """Compare assessments with the last poll to find the year groups to export.
+
+        Args:
+            kind (str): Query the assessments came from
+            tasks (List[dict]): Assessments returned by the API
+
+        Returns:
+            Tuple[Set[int], str, Dict[int, Tuple[bytes, Set[int]]]]: Watched year
+                groups affected, a summary, and the hashes to keep once exported
+        """
+        hashes: Dict[int, Tuple[bytes, Set[int]]] = {}
+        for task in tasks:
+            prefixes = year_prefixes(task["folder"]["code"])
+            hashes[task["id"]] = (
+                hashlib.blake2b(
+                    json.dumps(task, sort_keys=True).encode("UTF-8"), digest_size=16
+                ).digest(),
+                {year for year in self.year_groups if str(year) in prefixes},
+            )
+
+        previous = self.hashes.get(kind)
+        if previous is None:
+            return set(self.year_groups), "first poll", hashes
+
+        years: Set[int] = set()
+        added = changed = 0
+        for task_id, (task_hash, task_years) in hashes.items():
+            old = previous.get(task_id)
+            if old is None:
+                added += 1
+            elif old[0] != task_hash:
+                changed += 1
+            else:
+                continue
+            years |= task_years
+            if old is not None:
+                years |= old[1]
+        removed = previous.keys() - hashes.keys()
+        for task_id in removed:
+            years |= previous[task_id][1]
+
+        return (
+            years,
+            f"{added} added, {changed} changed, {len(removed)} removed assessments",
+            hashes,
+        )
+
+    def cycle(self) -> None:
+        """Poll every query once and export whatever changed.
+
+        What was seen is only kept once it is exported, so a failed export is
+        retried on the next poll instead of being taken as up to date.
+        """
+        # Page timings would otherwise pile up for as long as the watch runs
+        reset_metrics()
+        for kind, modes in self.queries.items():
+            pages, tasks, reason = self.poll(kind)
+            if tasks is None:
+                self.pages[kind] = pages
+                log(f"{kind}: no changes ({reason})")
+                continue
+
+            years, summary, hashes = self.affected(kind, tasks)
+            if not years:
+                self.pages[kind] = pages
+                self.hashes[kind] = hashes
+                log(f"{kind}: {reason}, {summary}, no watched year groups affected")
+                continue
+
+            start = self.start_date.strftime("%Y-%m-%d")
+            end = self.end_date.strftime("%Y-%m-%d")
+            for mode in modes:
+                result = parse_json(tasks, mode)
+                partitions = result.partition_by_years(sorted(years), start, end)
+                export_year_groups(mode, partitions, start, end, self.output_dir)
+            self.pages[kind] = pages
+            self.hashes[kind] = hashes
+            log(
+                f"{kind}: {reason}, {summary}, regenerated "
+                f"{', '.join(modes)} for year {', '.join(map(str, sorted(years)))}"
+            )
+        self.polls += 1
+
+    def run(self, interval: float) -> None:
+        """Poll forever, waiting `interval` seconds between the start of each poll.
+
+        Args:
+            interval (float): Seconds between polls
+        """
+        # Every poll has to reach the server
+        get_cache().refresh = True
+        while True:
+            started = time.monotonic()
+            try:
+                self.cycle()
+            except (OSError, ValueError) as error:
+                log(f"poll failed, retrying next interval: {error}")
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def watch_from_env(
+    start_date: str,
+    end_date: str,
+    modes: List[str],
+    year_groups: List[int],
+    interval: float,
+    output_dir: str = ".",
+) -> None:
+    """Start watching with the host and credentials from the environment.
+
+    Args:
+        start_date (str): First day of the window, YYYY-MM-DD
+        end_date (str): Last day of the window, YYYY-MM-DD
+        modes (List[str]): Modes to keep up to date
+        year_groups (List[int]): Year groups to keep up to date
+        interval (float): Seconds between polls
+        output_dir (str, optional): Directory to write to. Defaults to ".".
+
+    Raises:
+        ValueError: HOST environment variable not set
+    """
+    load_dotenv()
+    host = os.getenv("HOST")
+    if host is None:
+        raise ValueError("HOST environment variable not set")
+
+    watcher = Watcher(
+        host,
+        api_headers(),
+        datetime.strptime(start_date, "%Y-%m-%d"),
+        datetime.strptime(end_date, "%Y-%m-%d"),
+        modes,
+        year_groups,
+        output_dir,
+        int(os.getenv("WATCH_FULL_EVERY", "10")),
+    )
+    log(
+        f"watching {', '.join(modes)} for year "
+        f"{', '.join(map(str, year_groups))} every {interval:g} s"
+    )
+    watcher.run(interval)